@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "main",
     "rest_framework",
     "django_filters",
@@ -96,6 +97,27 @@ DATABASES = {
     }
 }
 
+# Read replicas as "host[:port],..."; they share the primary's credentials.
+for number, replica in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), start=1
+):
+    host, _, port = replica.strip().partition(":")
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["main.db_router.ReplicaRouter"]
+DB_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+# Replicas further behind than this are skipped, and all reads go to the
+# primary for this long after a catalog write.
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", 5))
+DB_REPLICA_LAG_INTERVAL = float(os.getenv("DB_REPLICA_LAG_INTERVAL", 5))
+# Clients read from the primary for this long after their own writes.
+DB_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", 15))
+
 CSRF_TRUSTED_ORIGINS = [
     "https://localhost",
     "https://127.0.0.1",
@@ -150,21 +172,33 @@ MEDIA_ROOT = BASE_DIR / "media"
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.environ.get("AWS_STORAGE_BUCKET_NAME")
-AWS_S3_SIGNATURE_NAME = "s3v4"
+AWS_S3_SIGNATURE_VERSION = "s3v4"
 AWS_S3_REGION_NAME = os.environ.get("AWS_S3_REGION_NAME")
 AWS_S3_FILE_OVERWRITE = False
 AWS_DEFAULT_ACL = "public-read"
 AWS_S3_VERIFY = True
+# Point at MinIO or a moto server to run direct uploads without AWS.
+AWS_S3_ENDPOINT_URL = os.environ.get("AWS_S3_ENDPOINT_URL")
+AWS_S3_ADDRESSING_STYLE = os.environ.get("AWS_S3_ADDRESSING_STYLE")
 
 STORAGES = {
     "default": {
-        "BACKEND": "storages.backends.s3boto3.S3StaticStorage",
+        "BACKEND": os.environ.get(
+            "MEDIA_STORAGE_BACKEND", "storages.backends.s3boto3.S3StaticStorage"
+        ),
     },
     "staticfiles": {
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
     },
 }
 
+# Content-addressed image blobs never change, so S3 serves them as immutable.
+STORAGES["images"] = dict(STORAGES["default"])
+if STORAGES["images"]["BACKEND"].startswith("storages.backends.s3"):
+    STORAGES["images"]["OPTIONS"] = {
+        "object_parameters": {"CacheControl": "public, max-age=31536000, immutable"}
+    }
+
 MICROSERVICE_API_KEY = os.environ.get("MICROSERVICE_API_KEY")
 
 PRODUCT_SERVICE = "http://nginx:80/api/v1/product/"
@@ -174,3 +208,77 @@ USER_SERVICE_URL = "http://nginx:80/api/v1/users/"
 PAYMENT_SERVICE_URL = "http://nginx:80/api/v1/payments/"
 
 GRAPHENE = {"SCHEMA": "API1.main.schema.schema"}
+
+GRAPHQL_MAX_DEPTH = int(os.getenv("GRAPHQL_MAX_DEPTH", 8))
+GRAPHQL_MAX_COST = int(os.getenv("GRAPHQL_MAX_COST", 10000))
+GRAPHQL_LIST_COST = int(os.getenv("GRAPHQL_LIST_COST", 10))
+GRAPHQL_DEFAULT_MAX_AGE = int(os.getenv("GRAPHQL_DEFAULT_MAX_AGE", 0))
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.getenv("GRAPHQL_DOCUMENT_CACHE_SIZE", 500))
+GRAPHQL_PERSISTED_QUERY_TIMEOUT = int(
+    os.getenv("GRAPHQL_PERSISTED_QUERY_TIMEOUT", 60 * 60 * 24 * 7)
+)
+# Operation names that always get their own metrics label; beyond them the
+# first GRAPHQL_METRICS_OPERATION_LIMIT names do, later ones are "other".
+GRAPHQL_METRICS_OPERATIONS = list(
+    filter(None, os.environ.get("GRAPHQL_METRICS_OPERATIONS", "").split(","))
+)
+GRAPHQL_METRICS_OPERATION_LIMIT = int(os.getenv("GRAPHQL_METRICS_OPERATION_LIMIT", 50))
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = os.getenv("REDIS_PORT", 6379)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django_prometheus.cache.backends.redis.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/1",
+    }
+}
+
+PRODUCT_CACHE_TIMEOUT = int(os.getenv("PRODUCT_CACHE_TIMEOUT", 300))
+PRODUCT_BATCH_MAX_IDS = int(os.getenv("PRODUCT_BATCH_MAX_IDS", 200))
+PRODUCT_BATCH_MAX_AGE = int(os.getenv("PRODUCT_BATCH_MAX_AGE", 30))
+
+# Pre-generated image variants: name -> bounding box in pixels, per format.
+PRODUCT_IMAGE_SIZES = {"thumbnail": 200, "medium": 800}
+PRODUCT_IMAGE_FORMATS = ["jpeg", "webp", "avif"]
+PRODUCT_IMAGE_QUALITY = int(os.getenv("PRODUCT_IMAGE_QUALITY", 80))
+PRODUCT_IMAGE_BLOB_GRACE = int(os.getenv("PRODUCT_IMAGE_BLOB_GRACE", 3600))
+PRODUCT_FILE_DELETE_WORKERS = int(os.getenv("PRODUCT_FILE_DELETE_WORKERS", 8))
+
+PRODUCT_UPLOAD_MAX_SIZE = int(os.getenv("PRODUCT_UPLOAD_MAX_SIZE", 10 * 1024 * 1024))
+PRODUCT_UPLOAD_EXPIRES = int(os.getenv("PRODUCT_UPLOAD_EXPIRES", 600))
+PRODUCT_UPLOAD_CONFIRM_GRACE = int(os.getenv("PRODUCT_UPLOAD_CONFIRM_GRACE", 3600))
+
+PRODUCT_CHANGES_PAGE_SIZE = int(os.getenv("PRODUCT_CHANGES_PAGE_SIZE", 500))
+PRODUCT_CHANGES_MAX_PAGE_SIZE = int(os.getenv("PRODUCT_CHANGES_MAX_PAGE_SIZE", 5000))
+PRODUCT_EXPORT_CHUNK_SIZE = int(os.getenv("PRODUCT_EXPORT_CHUNK_SIZE", 2000))
+# Products deleted per transaction when a category is deleted.
+PRODUCT_DELETE_BATCH_SIZE = int(os.getenv("PRODUCT_DELETE_BATCH_SIZE", 500))
+
+# Admin changelists count at most this many rows; larger tables are
+# counted from the planner statistics.
+ADMIN_COUNT_LIMIT = int(os.getenv("ADMIN_COUNT_LIMIT", 10000))
+
+# Optional in-process NumPy snapshot that answers filtered product lists.
+PRODUCT_SNAPSHOT = os.environ.get("PRODUCT_SNAPSHOT") == "True"
+PRODUCT_SNAPSHOT_MAX_AGE = int(os.getenv("PRODUCT_SNAPSHOT_MAX_AGE", 60))
+PRODUCT_SNAPSHOT_MAX_CHANGES = int(os.getenv("PRODUCT_SNAPSHOT_MAX_CHANGES", 10000))
+
+# Lower bucket edges of the facets endpoint; the last bucket is open-ended.
+PRODUCT_FACET_PRICE_BUCKETS = [0, 10, 25, 50, 100, 250, 500, 1000]
+PRODUCT_FACET_DISCOUNT_BUCKETS = [0, 10, 25, 50, 75]
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_ACCEPT_CONTENT = ["json"]
+CELERY_TASK_SERIALIZER = "json"
+CELERY_TIMEZONE = "UTC"
+
+from kombu import Queue
+
+CELERY_TASK_DEFAULT_QUEUE = "products"
+
+CELERY_TASK_QUEUES = (Queue("products", routing_key="products"),)
+
+CELERY_TASK_ROUTES = {
+    "main.tasks.*": {"queue": "products"},
+}
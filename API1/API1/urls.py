@@ -3,7 +3,7 @@ from django.urls import path, include
 from main.views import ProductAPIview, CategoryViewSet
 from rest_framework import routers
 from main.schema import schema
-from graphene_django.views import GraphQLView
+from main.graphql_view import ProductGraphQLView
 from django.views.decorators.csrf import csrf_exempt
 
 router = routers.DefaultRouter()
@@ -16,6 +16,6 @@ urlpatterns = [
     path("", include("django_prometheus.urls")),
     path(
         "api/v1/graphql/",
-        csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema)),
+        csrf_exempt(ProductGraphQLView.as_view(graphiql=True, schema=schema)),
     ),
 ]
@@ -1,10 +1,194 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Sum
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+
+from .deletion import start_category_deletion
 from .models import Product, Category, ProductImage
+from .pagination import KeysetPagination
+
+ESTIMATE_SQL = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator that never counts a whole large table. Without
+    filters the count comes from the planner statistics (pg_class.reltuples)
+    once they exceed ADMIN_COUNT_LIMIT rows (``estimated``); a filtered list
+    is counted up to ADMIN_COUNT_LIMIT rows only (``capped``).
+
+    LargeTableAdmin sets ``unfiltered`` when the changelist adds no filter
+    to the admin's own queryset, and ``get_excluded_count`` to the number of
+    rows that queryset leaves out of the estimate.
+    """
+
+    estimated = False
+    capped = False
+    unfiltered = None
+
+    def get_excluded_count(self):
+        return 0
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_COUNT_LIMIT
+        unfiltered = self.unfiltered
+        if unfiltered is None:
+            unfiltered = not queryset.query.where
+        if unfiltered:
+            with connections[queryset.db].cursor() as cursor:
+                cursor.execute(ESTIMATE_SQL, [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > limit:
+                self.estimated = True
+                return max(row[0] - self.get_excluded_count(), 0)
+
+        count = queryset[: limit + 1].count()
+        self.capped = count > limit
+        return min(count, limit)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paged by KeysetPagination in its default order, so the next
+    page is an index range scan instead of a growing OFFSET. Sorting by a
+    column or "Show all" falls back to numbered pages.
+    """
+
+    cursor_var = KeysetPagination.cursor_query_param
+
+    def __init__(self, *args, **kwargs):
+        self.keyset = None
+        super().__init__(*args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(self.cursor_var, None)
+        return params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter and sort links start from the first page again.
+        return super().get_query_string(new_params, [*(remove or []), self.cursor_var])
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params or self.show_all:
+            return super().get_results(request)
+
+        keyset = KeysetPagination()
+        keyset.page_size = self.list_per_page
+        try:
+            rows = keyset.paginate_queryset(
+                self.queryset.values(
+                    "id", keyset.orderings[keyset.default_ordering][0]
+                ),
+                Request(request),
+            )
+        except NotFound as e:
+            raise IncorrectLookupParameters(e) from e
+
+        # list_editable needs a queryset, so the page is read again by id.
+        self.result_list = self.queryset.filter(
+            pk__in=[row["id"] for row in rows]
+        ).order_by(*keyset.get_order_by(reverse=False))
+        self.paginator = self.model_admin.get_paginator(
+            request, self.queryset, self.list_per_page
+        )
+        self.result_count = self.paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = keyset.has_next or keyset.has_previous
+        self.keyset = keyset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Admin for tables too large to count or page through with OFFSET:
+    estimated counts, keyset pages and no second unfiltered count.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = "admin/main/keyset_change_list.html"
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_paginator(self, request, queryset, *args, **kwargs):
+        paginator = super().get_paginator(request, queryset, *args, **kwargs)
+        # Changelist filters and searches add conditions to get_queryset().
+        paginator.unfiltered = len(queryset.query.where.children) == len(
+            self.get_queryset(request).query.where.children
+        )
+        paginator.get_excluded_count = self.get_excluded_count
+        return paginator
+
+    def get_excluded_count(self):
+        """Rows of the table that get_queryset() leaves out."""
+        return 0
+
+
+class VisibleCategoryFilter(admin.RelatedFieldListFilter):
+    """Category filter without the categories being deleted."""
+
+    def field_choices(self, field, request, model_admin):
+        return field.get_choices(
+            include_blank=False,
+            ordering=self.field_admin_ordering(field, request, model_admin),
+            limit_choices_to={"hidden": False},
+        )
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ["name"]
+    list_display = ["name", "product_count", "available_count", "being_deleted"]
+    list_filter = ["hidden"]
+    search_fields = ["name"]
+
+    @admin.display(boolean=True, description="being deleted", ordering="hidden")
+    def being_deleted(self, obj):
+        return obj.hidden
+
+    def get_search_results(self, request, queryset, search_term):
+        # Autocomplete widgets (Product.category) offer visible categories only.
+        if request.path.endswith("/autocomplete/"):
+            queryset = queryset.visible()
+        return super().get_search_results(request, queryset, search_term)
+
+    def get_deleted_objects(self, objs, request):
+        # The products are deleted in the background; listing each of them
+        # on the confirmation page would load them all.
+        objs = list(objs)
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(self.opts.verbose_name)
+        model_count = {
+            self.opts.verbose_name_plural: len(objs),
+            Product._meta.verbose_name_plural: sum(
+                category.product_count for category in objs
+            ),
+        }
+        to_delete = [
+            f"{self.opts.verbose_name.capitalize()}: {category} "
+            f"({category.product_count} {Product._meta.verbose_name_plural})"
+            for category in objs
+        ]
+        return to_delete, model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        start_category_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for category in queryset:
+            start_category_deletion(category)
 
 
 class ProductImageInline(admin.TabularInline):
@@ -13,15 +197,40 @@ class ProductImageInline(admin.TabularInline):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = [
         "name",
+        "category",
         "price",
         "available",
         "created",
         "updated",
         "discount",
     ]
-    list_filter = ["available", "created", "updated"]
+    list_select_related = ["category"]
+    # Indexed columns only (not `updated`), so a filtered page in the
+    # default order is still an index scan.
+    list_filter = ["available", ("category", VisibleCategoryFilter), "created"]
     list_editable = ["price", "available", "discount"]
+    ordering = ["-created", "-id"]
+    # Other columns have no index to sort a large table by.
+    sortable_by = ["created"]
+    autocomplete_fields = ["category"]
     inlines = [ProductImageInline]
+
+    def get_queryset(self, request):
+        # Products of categories being deleted are already gone for the API.
+        return super().get_queryset(request).visible().defer("search_vector")
+
+    def get_excluded_count(self):
+        return (
+            Category.objects.filter(hidden=True).aggregate(total=Sum("product_count"))[
+                "total"
+            ]
+            or 0
+        )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "category":
+            kwargs["queryset"] = Category.objects.visible()
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
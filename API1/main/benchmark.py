@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.db import connection
+
+from .models import Category, Product
+
+WORDS = (
+    "apple banana cherry orange lemon mango peach grape melon berry coffee tea "
+    "juice bread cheese butter organic fresh premium classic family mini large sweet"
+).split()
+
+
+def add_arguments(parser, rows):
+    """The options every benchmark command takes; ``rows`` is the default."""
+    parser.add_argument("--rows", type=int, default=rows)
+    parser.add_argument(
+        "--seed",
+        action="store_true",
+        help="Insert synthetic products until the table has --rows rows",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+
+
+def measure(run, repeat):
+    """Median duration of ``repeat`` calls of ``run``, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def seed_products(rows, words=WORDS):
+    """
+    Insert synthetic products with a single INSERT ... SELECT until the
+    table holds ``rows`` products. Returns the number of inserted rows.
+    """
+    existing = Product.objects.count()
+    missing = rows - existing
+    if missing <= 0:
+        return 0
+
+    category, _ = Category.objects.get_or_create(name="benchmark")
+    array = "ARRAY[" + ", ".join(f"'{word}'" for word in words) + "]"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO main_product
+                (category_id, name, image, image_variants, description, price,
+                 available, created, updated, discount)
+            SELECT
+                %s,
+                ({array})[1 + (n * 7) %% {len(words)}] || ' '
+                    || ({array})[1 + (n * 13) %% {len(words)}] || ' ' || n,
+                '',
+                '{{}}',
+                ({array})[1 + (n * 17) %% {len(words)}] || ' '
+                    || ({array})[1 + (n * 19) %% {len(words)}],
+                1 + (n %% 500),
+                n %% 10 <> 0,
+                now(),
+                now(),
+                n %% 50
+            FROM generate_series(%s, %s) AS n
+            """,
+            [category.id, existing + 1, rows],
+        )
+        cursor.execute("ANALYZE main_product")
+    return missing
@@ -0,0 +1,208 @@
+import hashlib
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import storages
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .images import generate_variants
+from .models import ImageBlob, Product, ProductImage
+
+BLOB_PREFIX = "products/blobs/"
+# Rounds of store_blob() racing other workers and the collector.
+STORE_ATTEMPTS = 3
+
+
+def get_blob_storage():
+    return storages["images"]
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def store_blob(name):
+    """
+    Hash the stored file ``name`` and return the ImageBlob holding the same
+    bytes, with one reference taken for the caller. The file is copied to
+    its content-addressed name and its variants generated only when the
+    content is new.
+    """
+    storage = get_blob_storage()
+    with storage.open(name, "rb") as file:
+        digest = hashlib.file_digest(file, "sha256").hexdigest()
+
+    stored = None
+    for _ in range(STORE_ATTEMPTS):
+        if stored is None and not ImageBlob.objects.filter(sha256=digest).exists():
+            stored = copy_blob(name, digest, storage)
+        try:
+            with transaction.atomic():
+                blob, created = ImageBlob.objects.get_or_create(
+                    sha256=digest, defaults={"ref_count": 1, **(stored or {})}
+                )
+                # The reference is taken in the same transaction, so the
+                # collector cannot delete the blob in between.
+                if created or ImageBlob.objects.filter(pk=blob.pk).update(
+                    ref_count=F("ref_count") + 1, released=None
+                ):
+                    break
+        except IntegrityError:
+            # The blob was stored or collected by someone else meanwhile.
+            continue
+        # Collected after get_or_create() found it; stored again next round.
+    else:
+        raise IntegrityError(f"Could not store the blob of {name}.")
+
+    if stored is not None and not created:
+        # Another worker stored the same content first; drop this copy.
+        delete_files(
+            copy
+            for copy in [stored["name"], *get_variant_names(stored["variants"])]
+            if copy not in (blob.name, *get_variant_names(blob.variants))
+        )
+    return blob
+
+
+def copy_blob(name, digest, storage):
+    """
+    Copy the upload ``name`` to its content-addressed name and generate its
+    variants. Returns the ImageBlob fields describing the copy.
+    """
+    ext = os.path.splitext(name)[1].lower()
+    blob_name = f"{BLOB_PREFIX}{digest[:2]}/{digest}{ext}"
+    if name != blob_name and not storage.exists(blob_name):
+        with storage.open(name, "rb") as file:
+            blob_name = storage.save(blob_name, file)
+    return {
+        "name": blob_name,
+        "size": storage.size(blob_name),
+        "variants": generate_variants(blob_name, storage),
+    }
+
+
+def release_blob(name):
+    """
+    Drop one reference to the blob stored as ``name``, if it is one. Returns
+    True when nothing references the blob any more.
+    """
+    return release_blobs([name])
+
+
+def release_blobs(names):
+    """
+    Drop one reference per occurrence of a blob name in ``names``, with one
+    update per distinct count. Returns True when some of the blobs are no
+    longer referenced.
+    """
+    counts = Counter(name for name in names if is_blob_name(name))
+    if not counts:
+        return False
+    groups = defaultdict(list)
+    for name, count in counts.items():
+        groups[count].append(name)
+    for count, group in groups.items():
+        ImageBlob.objects.filter(name__in=group).update(
+            ref_count=F("ref_count") - count
+        )
+    return bool(
+        ImageBlob.objects.filter(name__in=counts, ref_count__lte=0).update(
+            released=timezone.now()
+        )
+    )
+
+
+def get_variant_names(variants):
+    return [
+        name
+        for size_name, names in variants.items()
+        if size_name != "source"
+        for name in names.values()
+    ]
+
+
+def delete_files(names):
+    """
+    Delete stored files, PRODUCT_FILE_DELETE_WORKERS requests at a time.
+    Returns the number of files.
+    """
+    names = list(names)
+    if names:
+        storage = get_blob_storage()
+        with ThreadPoolExecutor(settings.PRODUCT_FILE_DELETE_WORKERS) as pool:
+            list(pool.map(storage.delete, names))
+    return len(names)
+
+
+def delete_upload(name, variants=None):
+    """
+    Delete an upload that is not a blob (or was moved to one), with the
+    variants generated for it, unless a row still uses it.
+    """
+    if count_references([name])[name]:
+        return
+    names = [name]
+    if variants and variants.get("source") == name:
+        names.extend(get_variant_names(variants))
+    delete_files(names)
+
+
+def count_references(names):
+    counts = dict.fromkeys(names, 0)
+    for model in (Product, ProductImage):
+        rows = (
+            model.objects.filter(image__in=names)
+            .values("image")
+            .annotate(total=Count("id"))
+        )
+        for row in rows:
+            counts[row["image"]] += row["total"]
+    return counts
+
+
+def collect_blobs(batch_size=500):
+    """
+    Delete blobs that have been unreferenced for longer than the grace
+    period, together with their variants. Reference counts are only a hint:
+    each candidate is checked against the image columns first and its
+    count repaired if something still points at it. Returns the number of
+    deleted blobs.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.PRODUCT_IMAGE_BLOB_GRACE)
+    deleted = 0
+
+    while True:
+        with transaction.atomic():
+            blobs = list(
+                ImageBlob.objects.select_for_update(skip_locked=True)
+                .filter(ref_count__lte=0, released__lt=cutoff)
+                .order_by("id")[:batch_size]
+            )
+            if not blobs:
+                break
+            counts = count_references([blob.name for blob in blobs])
+            garbage = []
+            for blob in blobs:
+                if counts[blob.name]:
+                    blob.ref_count = counts[blob.name]
+                    blob.released = None
+                    blob.save(update_fields=["ref_count", "released"])
+                else:
+                    garbage.append(blob)
+            # The files go while the rows are still locked: store_blob() for
+            # the same content waits for the delete to commit, then finds
+            # no file to reuse and copies the content again.
+            delete_files(
+                name
+                for blob in garbage
+                for name in [blob.name, *get_variant_names(blob.variants)]
+            )
+            ImageBlob.objects.filter(pk__in=[blob.pk for blob in garbage]).delete()
+        deleted += len(garbage)
+
+    return deleted
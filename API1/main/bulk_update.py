@@ -0,0 +1,178 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least, Round
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import bump_catalog_version
+from .filters import ProductFilter
+from .models import Product
+
+MIN_PRICE = Decimal("0.01")
+MAX_DISCOUNT = Decimal("99.99")
+
+
+class ProductChangesSerializer(serializers.Serializer):
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    price_percent = serializers.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        min_value=Decimal("-99.99"),
+        max_value=Decimal("1000"),
+        required=False,
+    )
+    discount = serializers.DecimalField(max_digits=4, decimal_places=2, required=False)
+    discount_percent = serializers.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        min_value=Decimal("-100"),
+        max_value=Decimal("1000"),
+        required=False,
+    )
+    available = serializers.BooleanField(required=False)
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError("No changes specified.")
+
+        if "price" in data and "price_percent" in data:
+            raise serializers.ValidationError(
+                {"price": "Use either price or price_percent, not both."}
+            )
+
+        if "discount" in data and "discount_percent" in data:
+            raise serializers.ValidationError(
+                {"discount": "Use either discount or discount_percent, not both."}
+            )
+
+        price = data.get("price")
+        discount = data.get("discount")
+
+        if price is not None and price <= 0:
+            raise serializers.ValidationError(
+                {"price": "Price must be greater than 0."}
+            )
+
+        if discount is not None and (discount < 0 or discount > 100):
+            raise serializers.ValidationError(
+                {"discount": "Discount must be between 0 and 100."}
+            )
+
+        if data.get("available") is False and (
+            "price" in data or "price_percent" in data
+        ):
+            raise serializers.ValidationError(
+                {
+                    "available": "If the product is unavailable, the price should not be specified."
+                }
+            )
+
+        return data
+
+
+class ProductBulkUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=100000
+    )
+    category = serializers.IntegerField(required=False)
+    filters = serializers.DictField(required=False)
+    changes = ProductChangesSerializer()
+
+    def validate_filters(self, value):
+        filterset = ProductFilter(value, queryset=Product.objects.visible())
+        unknown = set(value) - set(filterset.filters)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown filters: {', '.join(sorted(unknown))}."
+            )
+        if not filterset.is_valid():
+            raise serializers.ValidationError(filterset.errors)
+        return value
+
+    def validate(self, data):
+        if not (data.get("ids") or data.get("category") or data.get("filters")):
+            raise serializers.ValidationError(
+                "Select products with ids, category or filters."
+            )
+        return data
+
+    def get_queryset(self):
+        data = self.validated_data
+        queryset = Product.objects.visible()
+        if data.get("ids"):
+            queryset = queryset.filter(id__in=data["ids"])
+        if data.get("category"):
+            queryset = queryset.filter(category_id=data["category"])
+        if data.get("filters"):
+            queryset = ProductFilter(data["filters"], queryset=queryset).qs
+        return queryset
+
+
+def get_update_values(changes):
+    """Translate validated changes into expressions for QuerySet.update()."""
+    values = {"updated": timezone.now()}
+
+    if "price" in changes:
+        values["price"] = changes["price"]
+    elif "price_percent" in changes:
+        values["price"] = Greatest(
+            Round(F("price") * (100 + changes["price_percent"]) / 100, 2),
+            Value(MIN_PRICE),
+        )
+
+    if "discount" in changes:
+        values["discount"] = changes["discount"]
+    elif "discount_percent" in changes:
+        values["discount"] = Least(
+            Greatest(
+                Round(F("discount") * (100 + changes["discount_percent"]) / 100, 2),
+                Value(Decimal("0")),
+            ),
+            Value(MAX_DISCOUNT),
+        )
+
+    if "available" in changes:
+        values["available"] = changes["available"]
+
+    return values
+
+
+def bulk_update_products(queryset, changes, batch_size=5000):
+    """
+    Apply ``changes`` to every product in ``queryset``.
+
+    Matching ids are walked in primary key order and each batch is changed
+    by one UPDATE in its own transaction, so row locks stay short. The
+    UPDATE checks the conditions of ``queryset`` again, leaving alone rows
+    that stopped matching after their ids were read. As with a single
+    product, unavailable products are not given a new price unless the
+    same change makes them available. Returns the number of updated
+    products.
+    """
+    values = get_update_values(changes)
+    if "price" in values and changes.get("available") is not True:
+        if set(values) == {"price", "updated"}:
+            queryset = queryset.filter(available=True)
+        else:
+            values["price"] = Case(
+                When(available=True, then=values["price"]),
+                default=F("price"),
+                output_field=Product._meta.get_field("price"),
+            )
+    ids = queryset.order_by("id").values_list("id", flat=True)
+    affected = 0
+    last_id = 0
+
+    while True:
+        batch = list(ids.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            affected += queryset.filter(id__in=batch).update(**values)
+        last_id = batch[-1]
+
+    if affected:
+        transaction.on_commit(bump_catalog_version)
+    return affected
@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from prometheus_client import Counter
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_WRITTEN_KEY = "catalog:written"
+
+response_cache_hits = Counter(
+    "product_response_cache_hits_total",
+    "Product service responses served from the Redis cache.",
+    ["view"],
+)
+response_cache_misses = Counter(
+    "product_response_cache_misses_total",
+    "Product service responses built from the database.",
+    ["view"],
+)
+
+
+def get_catalog_version():
+    try:
+        version = cache.get(CATALOG_VERSION_KEY)
+        if version is None:
+            # Seed from the clock so a lost key never reuses an old version.
+            cache.add(CATALOG_VERSION_KEY, int(time.time()), timeout=None)
+            version = cache.get(CATALOG_VERSION_KEY)
+        return version
+    except Exception as e:
+        logging.error(f"Failed to read catalog version: {str(e)}")
+        return None
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, int(time.time()), timeout=None)
+    except Exception as e:
+        logging.error(f"Failed to bump catalog version: {str(e)}")
+    try:
+        cache.set(CATALOG_WRITTEN_KEY, time.time(), timeout=None)
+    except Exception as e:
+        logging.error(f"Failed to record catalog write time: {str(e)}")
+
+
+def get_last_catalog_write():
+    """Unix time of the last committed catalog write, or 0 if unknown."""
+    try:
+        return cache.get(CATALOG_WRITTEN_KEY) or 0
+    except Exception as e:
+        logging.error(f"Failed to read catalog write time: {str(e)}")
+        return 0
+
+
+def normalize_query(query_dict):
+    items = []
+    for key in sorted(query_dict.keys()):
+        values = sorted(value for value in query_dict.getlist(key) if value != "")
+        if values:
+            items.append(f"{key}={','.join(values)}")
+    return "&".join(items)
+
+
+def make_cache_key(view_name, request, *parts, version=None):
+    if version is None:
+        version = get_catalog_version()
+    if version is None:
+        return None
+    raw = "|".join(
+        [request.get_host()]
+        + [str(part) for part in parts]
+        + [normalize_query(request.GET)]
+    )
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return f"catalog:{version}:{view_name}:{digest}"
+
+
+def get_cached(key):
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logging.error(f"Failed to read response cache: {str(e)}")
+        return None
+
+
+def set_cached(key, data, timeout=None):
+    if timeout is None:
+        timeout = settings.PRODUCT_CACHE_TIMEOUT
+    try:
+        cache.set(key, data, timeout=timeout)
+    except Exception as e:
+        logging.error(f"Failed to write response cache: {str(e)}")
+
+
+def cached_response(view_name, request, build_response, *parts):
+    """Serve a GET response from Redis, building and storing it on a miss."""
+    key = make_cache_key(view_name, request, *parts)
+    if key is None:
+        return build_response()
+
+    data = get_cached(key)
+    if data is not None:
+        response_cache_hits.labels(view_name).inc()
+        return Response(data)
+
+    from .db_router import replica_may_be_stale
+
+    response_cache_misses.labels(view_name).inc()
+    response = build_response()
+    if response.status_code == 200 and not replica_may_be_stale():
+        set_cached(key, response.data)
+    return response
+
+
+def make_etag(request, *parts):
+    """
+    Strong ETag for a representation: the given parts plus everything else
+    the response body depends on (host, renderer and query string).
+    """
+    raw = "|".join(
+        [request.get_host(), request.accepted_renderer.format]
+        + [str(part) for part in parts]
+        + [normalize_query(request.GET)]
+    )
+    return quote_etag(hashlib.sha1(raw.encode("utf-8")).hexdigest())
+
+
+def catalog_etag(request, *parts):
+    """ETag for views whose output may change with any catalog write."""
+    from .db_router import replica_may_be_stale
+
+    version = get_catalog_version()
+    if version is None or replica_may_be_stale():
+        return None
+    return make_etag(request, version, *parts)
+
+
+def conditional_response(request, build_response, etag, last_modified=None):
+    """
+    Answer 304 Not Modified when the client's If-None-Match/If-Modified-Since
+    validators still match, otherwise build the response and tag it.
+    """
+    if etag is None:
+        return build_response()
+    if last_modified is not None:
+        last_modified = int(last_modified.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build_response()
+
+    if response.status_code in (200, 304):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+    return response
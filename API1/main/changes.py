@@ -0,0 +1,55 @@
+from .models import CatalogChange, Category, Product
+from .serializers import CategorySerializer, ProductValuesSerializer
+
+
+def get_changes(since, limit, context):
+    """
+    Changes with a sequence number above ``since``, oldest first, each with
+    the current representation of its product or category, or as a
+    tombstone if it no longer exists or is being deleted.
+    """
+    changes = list(
+        CatalogChange.objects.filter(seq__gt=since).order_by("seq")[: limit + 1]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    ids = {CatalogChange.PRODUCT: [], CatalogChange.CATEGORY: []}
+    for change in changes:
+        if not change.deleted:
+            ids[change.model].append(change.object_id)
+
+    objects = {CatalogChange.PRODUCT: {}, CatalogChange.CATEGORY: {}}
+    if ids[CatalogChange.PRODUCT]:
+        rows = ProductValuesSerializer.values(
+            Product.objects.visible().filter(id__in=ids[CatalogChange.PRODUCT])
+        )
+        for data in ProductValuesSerializer(context).serialize(rows):
+            objects[CatalogChange.PRODUCT][data["id"]] = data
+    if ids[CatalogChange.CATEGORY]:
+        categories = Category.objects.visible().filter(
+            id__in=ids[CatalogChange.CATEGORY]
+        )
+        for data in CategorySerializer(categories, many=True).data:
+            objects[CatalogChange.CATEGORY][data["id"]] = data
+
+    results = []
+    for change in changes:
+        # A row deleted after this change was logged has a tombstone with a
+        # higher seq already; report it as deleted here as well.
+        data = objects[change.model].get(change.object_id)
+        results.append(
+            {
+                "seq": change.seq,
+                "type": change.model,
+                "id": change.object_id,
+                "deleted": data is None,
+                "data": data,
+            }
+        )
+
+    return {
+        "results": results,
+        "next_since": changes[-1].seq if changes else since,
+        "has_more": has_more,
+    }
@@ -0,0 +1,188 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from prometheus_client import Counter, Gauge
+
+from .cache import get_last_catalog_write
+
+PIN_COOKIE = "product_db_pinned"
+# For clients without cookies: echo the header of the write response.
+PIN_HEADER = "X-Product-DB-Pinned-Until"
+
+# pg_stat_wal_receiver shows the status to superusers and members of
+# pg_read_all_stats only; to others the replica never looks streaming.
+LAG_SQL = """
+SELECT
+    pg_is_in_recovery(),
+    EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'),
+    pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(),
+    EXTRACT(EPOCH FROM pg_last_xact_replay_timestamp()),
+    EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+"""
+
+read_routes = Counter(
+    "product_db_read_routes_total",
+    "Requests by the database their reads were sent to and why.",
+    ["database", "reason"],
+)
+replica_lag = Gauge(
+    "product_db_replica_lag_seconds",
+    "Replication lag of each read replica as last measured by this process.",
+    ["database"],
+)
+
+# Database alias for reads in the current request; None reads from default.
+read_database = ContextVar("read_database", default=None)
+
+# alias -> (monotonic time of the check, lag in seconds), per process.
+lag_checks = {}
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica chosen for the current request, if any, and
+    everything else to the primary. Replicas mirror the primary, so they
+    are never migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+def get_replica_lag(alias):
+    """Replication lag of ``alias`` in seconds, re-measured once per interval."""
+    now = time.monotonic()
+    checked = lag_checks.get(alias)
+    if checked is not None and now - checked[0] < settings.DB_REPLICA_LAG_INTERVAL:
+        return checked[1]
+
+    try:
+        with connections[alias].cursor() as cursor:
+            lag = measure_replica_lag(cursor)
+    except DatabaseError as e:
+        logging.error(f"Failed to check replica lag of {alias}: {str(e)}")
+        lag = float("inf")
+
+    lag_checks[alias] = (now, lag)
+    replica_lag.labels(alias).set(lag)
+    return lag
+
+
+def measure_replica_lag(cursor):
+    """
+    Replication lag in seconds of the database behind ``cursor``. A replica
+    that replayed everything it received is only caught up while its WAL
+    receiver is streaming: a disconnected one replays nothing new. It then
+    counts as caught up only if it replayed a transaction after the last
+    catalog write.
+    """
+    cursor.execute(LAG_SQL)
+    in_recovery, streaming, replayed_all, replayed, age = cursor.fetchone()
+    if not in_recovery or (streaming and replayed_all):
+        return 0.0
+    if replayed is None:
+        # Nothing replayed yet: as good as unreachable.
+        return float("inf")
+    if not streaming and 0 < get_last_catalog_write() <= replayed:
+        return 0.0
+    return float(age)
+
+
+def is_pinned(request):
+    """Whether this client wrote recently and must read its own writes."""
+    if request.COOKIES.get(PIN_COOKIE):
+        return True
+    try:
+        until = float(request.headers.get(PIN_HEADER, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    return now < until <= now + settings.DB_REPLICA_PIN_SECONDS
+
+
+def choose_read_database(request):
+    """
+    Pick the database for the reads of one request and report why: a
+    random replica within the lag limit, unless this client wrote recently
+    (read-your-writes).
+    """
+    replicas = settings.DB_REPLICAS
+    if not replicas:
+        return None, "no_replica"
+    if is_pinned(request):
+        return None, "pinned"
+
+    healthy = [
+        alias
+        for alias in replicas
+        if get_replica_lag(alias) <= settings.DB_REPLICA_MAX_LAG
+    ]
+    if not healthy:
+        return None, "lagging"
+    return random.choice(healthy), "replica"
+
+
+@contextmanager
+def read_from_replica(request):
+    alias, reason = choose_read_database(request)
+    read_routes.labels(alias or "default", reason).inc()
+    token = read_database.set(alias)
+    try:
+        yield alias
+    finally:
+        read_database.reset(token)
+
+
+def replica_may_be_stale():
+    """
+    Whether this request reads from a replica that may not have the last
+    catalog write yet. Such responses must not be stored under the new
+    catalog version, in the response cache or as an ETag.
+    """
+    return (
+        read_database.get() is not None
+        and time.time() - get_last_catalog_write() < settings.DB_REPLICA_MAX_LAG
+    )
+
+
+def pin_to_primary(response):
+    """Send this client's reads to the primary for the next few seconds."""
+    response.set_cookie(
+        PIN_COOKIE,
+        "1",
+        max_age=settings.DB_REPLICA_PIN_SECONDS,
+        httponly=True,
+        samesite="Lax",
+    )
+    response[PIN_HEADER] = str(int(time.time()) + settings.DB_REPLICA_PIN_SECONDS)
+
+
+class ReplicaReadMixin:
+    """
+    Serve safe requests of a view from a read replica, and pin clients to
+    the primary after a successful write.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in ("GET", "HEAD", "OPTIONS"):
+            with read_from_replica(request):
+                return super().dispatch(request, *args, **kwargs)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code < 400 and settings.DB_REPLICAS:
+            pin_to_primary(response)
+        return response
@@ -0,0 +1,94 @@
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .blobs import count_references, get_variant_names, is_blob_name, release_blobs
+from .cache import bump_catalog_version
+from .models import Category, CategoryDeletion, Product, ProductImage
+
+DELETE_SQL = "DELETE FROM {table} WHERE {column} = ANY(%s)"
+
+
+def start_category_deletion(category):
+    """
+    Hide ``category`` from every read and schedule delete_category_task for
+    its products. Returns the CategoryDeletion, or None if the category is
+    already being deleted.
+    """
+    from .tasks import delete_category_task
+
+    with transaction.atomic():
+        if not Category.objects.filter(pk=category.pk, hidden=False).update(
+            hidden=True
+        ):
+            return None
+        deletion = CategoryDeletion.objects.create(
+            category_id=category.pk,
+            name=category.name,
+            total=category.product_count,
+        )
+        transaction.on_commit(bump_catalog_version)
+        transaction.on_commit(lambda: delete_category_task.delay(deletion.pk))
+    return deletion
+
+
+def delete_product_batch(deletion, batch_size):
+    """
+    Delete up to ``batch_size`` products of the category of ``deletion``,
+    with their images, in one short transaction. The rows are deleted with
+    plain SQL, so no instance is loaded and no delete signal runs: blob
+    references are released in bulk instead. Returns the number of deleted
+    products, whether some blob is no longer referenced, and the stored
+    files to delete once the transaction has committed.
+    """
+    with transaction.atomic():
+        ids = list(
+            Product.objects.filter(category_id=deletion.category_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0, False, []
+
+        rows = [
+            *ProductImage.objects.filter(product_id__in=ids).values_list(
+                "image", "image_variants"
+            ),
+            *Product.objects.filter(id__in=ids).values_list("image", "image_variants"),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                DELETE_SQL.format(
+                    table=ProductImage._meta.db_table, column="product_id"
+                ),
+                [ids],
+            )
+            cursor.execute(
+                DELETE_SQL.format(table=Product._meta.db_table, column="id"), [ids]
+            )
+            deleted = cursor.rowcount
+
+        names = [name for name, _ in rows if name]
+        released = release_blobs(names)
+        # Blob files go through collect_blobs; an upload that was never moved
+        # to a blob is deleted here unless another row still uses it.
+        counts = count_references([name for name in names if not is_blob_name(name)])
+        files = [
+            file
+            for name, variants in rows
+            if name in counts and not counts[name]
+            for file in [name, *get_variant_names(variants)]
+        ]
+        CategoryDeletion.objects.filter(pk=deletion.pk).update(
+            deleted=F("deleted") + deleted
+        )
+    return deleted, released, files
+
+
+def finish_deletion(deletion):
+    """Delete the emptied category and mark ``deletion`` finished."""
+    with transaction.atomic():
+        Category.objects.filter(pk=deletion.category_id, hidden=True).delete()
+        CategoryDeletion.objects.filter(pk=deletion.pk).update(
+            finished=timezone.now(), error=""
+        )
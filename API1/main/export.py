@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+
+from django.conf import settings
+
+from .serializers import ProductValuesSerializer
+
+EXPORT_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Bytes collected before a chunk is handed to the server.
+BUFFER_SIZE = 64 * 1024
+
+
+def iter_records(queryset, context, chunk_size):
+    """
+    Yield product dicts in the API representation, reading ``queryset``
+    through a server-side cursor ``chunk_size`` rows at a time.
+    """
+    rows = ProductValuesSerializer.values(queryset).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        # A fresh serializer per chunk keeps its URL caches from growing
+        # with the catalog.
+        yield from ProductValuesSerializer(context).serialize(chunk)
+
+
+def iter_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def iter_csv(records):
+    buffer = io.StringIO()
+    writer = None
+    for record in records:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(record))
+            writer.writeheader()
+        record["image_variants"] = json.dumps(
+            record["image_variants"], separators=(",", ":")
+        )
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_bytes(lines, compress=False):
+    """Encode ``lines`` to UTF-8 in chunks of about BUFFER_SIZE bytes."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    parts = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            chunk = b"".join(parts)
+            parts = []
+            size = 0
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = b"".join(parts)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def export_products(queryset, fmt, context, compress=False, chunk_size=None):
+    """Stream ``queryset`` as NDJSON or CSV bytes, gzipped if ``compress``."""
+    if chunk_size is None:
+        chunk_size = settings.PRODUCT_EXPORT_CHUNK_SIZE
+    records = iter_records(queryset.order_by("id"), context, chunk_size)
+    lines = iter_ndjson(records) if fmt == "ndjson" else iter_csv(records)
+    return iter_bytes(lines, compress)
@@ -0,0 +1,136 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+
+# Bits of GROUPING(category_id, available, price_bucket, discount_bucket):
+# a set | 1 for every column it does not group by.
+CATEGORY_SET = 0b0111
+AVAILABILITY_SET = 0b1011
+PRICE_SET = 0b1101
+DISCOUNT_SET = 0b1110
+TOTAL_SET = 0b1111
+
+FACETS_SQL = """
+SELECT
+    GROUPING(category_id, available, price_bucket, discount_bucket),
+    category_id,
+    MIN(category_name),
+    available,
+    price_bucket,
+    discount_bucket,
+    COUNT(*),
+    MIN(sell_price),
+    MAX(sell_price)
+FROM (
+    SELECT
+        category_id,
+        category_name,
+        available,
+        sell_price,
+        width_bucket(sell_price, %s::numeric[]) AS price_bucket,
+        width_bucket(discount, %s::numeric[]) AS discount_bucket
+    FROM ({products}) AS products
+) AS facets
+GROUP BY GROUPING SETS (
+    (category_id), (available), (price_bucket), (discount_bucket), ()
+)
+"""
+
+
+def format_decimal(value):
+    return None if value is None else f"{Decimal(value):.2f}"
+
+
+def get_buckets(edges, counts):
+    """
+    Buckets ``[edges[i], edges[i + 1])`` with their counts, as numbered by
+    width_bucket(): 0 below the first edge, len(edges) from the last one on.
+    """
+    bounds = [None] + [Decimal(edge) for edge in edges] + [None]
+    buckets = []
+    for number in range(len(bounds) - 1):
+        if number == 0 and not counts.get(0):
+            # Nothing sells below the first edge (prices are positive).
+            continue
+        buckets.append(
+            {
+                "from": format_decimal(bounds[number]),
+                "to": format_decimal(bounds[number + 1]),
+                "count": counts.get(number, 0),
+            }
+        )
+    return buckets
+
+
+def get_facets(queryset):
+    """
+    Count the products in ``queryset`` per category, availability, sell
+    price bucket and discount bucket, in a single GROUPING SETS query.
+    """
+    price_edges = [Decimal(edge) for edge in settings.PRODUCT_FACET_PRICE_BUCKETS]
+    discount_edges = [Decimal(edge) for edge in settings.PRODUCT_FACET_DISCOUNT_BUCKETS]
+    products = queryset.order_by().values(
+        "category_id",
+        "available",
+        "sell_price",
+        "discount",
+        category_name=F("category__name"),
+    )
+    sql, params = products.query.sql_with_params()
+
+    with connections[products.db].cursor() as cursor:
+        cursor.execute(
+            FACETS_SQL.format(products=sql),
+            [price_edges, discount_edges, *params],
+        )
+        rows = cursor.fetchall()
+
+    total = 0
+    price_range = {"min": None, "max": None}
+    categories = []
+    availability = {True: 0, False: 0}
+    price_counts = {}
+    discount_counts = {}
+    for (
+        grouping,
+        category_id,
+        category_name,
+        available,
+        price_bucket,
+        discount_bucket,
+        count,
+        min_price,
+        max_price,
+    ) in rows:
+        if grouping == CATEGORY_SET:
+            categories.append(
+                {"id": category_id, "name": category_name, "count": count}
+            )
+        elif grouping == AVAILABILITY_SET:
+            availability[available] = count
+        elif grouping == PRICE_SET:
+            price_counts[price_bucket] = count
+        elif grouping == DISCOUNT_SET:
+            discount_counts[discount_bucket] = count
+        elif grouping == TOTAL_SET:
+            total = count
+            price_range = {
+                "min": format_decimal(min_price),
+                "max": format_decimal(max_price),
+            }
+
+    categories.sort(key=lambda category: (-category["count"], category["name"]))
+    return {
+        "total": total,
+        "categories": categories,
+        "availability": [
+            {"value": value, "count": count} for value, count in availability.items()
+        ],
+        "sell_price": {
+            **price_range,
+            "buckets": get_buckets(price_edges, price_counts),
+        },
+        "discount": {"buckets": get_buckets(discount_edges, discount_counts)},
+    }
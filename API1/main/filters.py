@@ -1,10 +1,10 @@
 from django_filters import rest_framework as filters
-from django.db.models import F, ExpressionWrapper, DecimalField
 from .models import Product
+from .search import search_products
 
 
 class ProductFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr="icontains", label="Search by name")
+    name = filters.CharFilter(method="filter_name", label="Search by name")
     price_min = filters.NumberFilter(method="filter_price_min", label="Min sell price")
     price_max = filters.NumberFilter(method="filter_price_max", label="Max sell price")
     discount_min = filters.NumberFilter(
@@ -26,19 +26,11 @@ class ProductFilter(filters.FilterSet):
             "available",
         ]
 
-    def annotate_sell_price(self, queryset):
-
-        return queryset.annotate(
-            sell_price=ExpressionWrapper(
-                F("price") - (F("price") * F("discount") / 100),
-                output_field=DecimalField(max_digits=10, decimal_places=2),
-            )
-        )
+    def filter_name(self, queryset, name, value):
+        return search_products(queryset, value)
 
     def filter_price_min(self, queryset, name, value):
-        queryset = self.annotate_sell_price(queryset)
         return queryset.filter(sell_price__gte=value)
 
     def filter_price_max(self, queryset, name, value):
-        queryset = self.annotate_sell_price(queryset)
         return queryset.filter(sell_price__lte=value)
@@ -0,0 +1,397 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotAllowed
+from django.utils.cache import patch_cache_control
+from graphene.validation import depth_limit_validator
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+)
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from graphql.type import (
+    get_named_type,
+    get_nullable_type,
+    is_list_type,
+    is_object_type,
+)
+from graphql.validation import ValidationRule, specified_rules
+from prometheus_client import Histogram
+
+from .cache import (
+    get_cached,
+    get_catalog_version,
+    response_cache_hits,
+    response_cache_misses,
+    set_cached,
+)
+from .cache_control import get_operation_max_age
+from .db_router import read_from_replica, replica_may_be_stale
+
+PERSISTED_QUERY_KEY = "graphql:persisted:{}"
+
+graphql_phase_duration = Histogram(
+    "graphql_operation_phase_seconds",
+    "Time spent parsing, validating and executing GraphQL operations.",
+    ["operation", "phase"],
+)
+
+
+def query_cost_validator(max_cost, list_cost):
+    """
+    Reject operations whose estimated cost exceeds ``max_cost``. Every field
+    costs 1 and the cost of a list field's selection is multiplied by
+    ``list_cost``, the number of rows a list is assumed to return.
+    """
+
+    class QueryCostValidator(ValidationRule):
+        def enter_operation_definition(self, node, *_args):
+            root_type = self.context.schema.get_root_type(node.operation)
+            if root_type is None:
+                return
+            cost = self.selection_cost(node.selection_set, root_type, frozenset())
+            if cost > max_cost:
+                name = node.name.value if node.name else "anonymous"
+                self.report_error(
+                    GraphQLError(
+                        f"'{name}' exceeds maximum operation cost of {max_cost} "
+                        f"(cost {cost}).",
+                        [node],
+                    )
+                )
+
+        def selection_cost(self, selection_set, parent_type, fragments):
+            schema = self.context.schema
+            total = 0
+            for selection in selection_set.selections:
+                if isinstance(selection, FieldNode):
+                    name = selection.name.value
+                    if name.startswith("__") or not is_object_type(parent_type):
+                        continue
+                    field = parent_type.fields.get(name)
+                    if field is None:
+                        continue
+                    cost = 1
+                    if selection.selection_set is not None:
+                        child = self.selection_cost(
+                            selection.selection_set,
+                            get_named_type(field.type),
+                            fragments,
+                        )
+                        if is_list_type(get_nullable_type(field.type)):
+                            child *= list_cost
+                        cost += child
+                    total += cost
+                elif isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.context.get_fragment(name)
+                    if fragment is None or name in fragments:
+                        continue
+                    total += self.selection_cost(
+                        fragment.selection_set,
+                        schema.get_type(fragment.type_condition.name.value),
+                        fragments | {name},
+                    )
+                elif isinstance(selection, InlineFragmentNode):
+                    fragment_type = parent_type
+                    if selection.type_condition is not None:
+                        fragment_type = schema.get_type(
+                            selection.type_condition.name.value
+                        )
+                    total += self.selection_cost(
+                        selection.selection_set, fragment_type, fragments
+                    )
+            return total
+
+    return QueryCostValidator
+
+
+def get_persisted_query(query_hash):
+    try:
+        return cache.get(PERSISTED_QUERY_KEY.format(query_hash))
+    except Exception as e:
+        logging.error(f"Failed to read persisted query: {str(e)}")
+        return None
+
+
+def set_persisted_query(query_hash, query):
+    try:
+        cache.set(
+            PERSISTED_QUERY_KEY.format(query_hash),
+            query,
+            timeout=settings.GRAPHQL_PERSISTED_QUERY_TIMEOUT,
+        )
+    except Exception as e:
+        logging.error(f"Failed to store persisted query: {str(e)}")
+
+
+class DocumentCache:
+    """Bounded LRU of parsed and validated GraphQL documents."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.documents = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.documents.get(key)
+            if entry is not None:
+                self.documents.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self.lock:
+            self.documents[key] = entry
+            self.documents.move_to_end(key)
+            while len(self.documents) > self.maxsize:
+                self.documents.popitem(last=False)
+
+
+document_cache = DocumentCache(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+
+
+class OperationLabels:
+    """
+    Metric label values for operation names, so clients cannot create
+    unbounded series: names in GRAPHQL_METRICS_OPERATIONS always get their
+    own label, the first ``limit`` other names seen by this process too,
+    and every later name is counted as "other".
+    """
+
+    def __init__(self, allowed, limit):
+        self.allowed = set(allowed)
+        self.limit = limit
+        self.names = set()
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        if name in self.allowed:
+            return name
+        with self.lock:
+            if name in self.names:
+                return name
+            if len(self.names) < self.limit:
+                self.names.add(name)
+                return name
+        return "other"
+
+
+operation_labels = OperationLabels(
+    settings.GRAPHQL_METRICS_OPERATIONS, settings.GRAPHQL_METRICS_OPERATION_LIMIT
+)
+
+
+class ProductGraphQLView(GraphQLView):
+    """
+    GraphQLView with automatic persisted queries, a shared cache of parsed
+    and validated documents, depth/cost limits, per-phase timings and reads
+    from a replica.
+    """
+
+    validation_rules = (
+        *specified_rules,
+        depth_limit_validator(max_depth=settings.GRAPHQL_MAX_DEPTH),
+        query_cost_validator(
+            max_cost=settings.GRAPHQL_MAX_COST, list_cost=settings.GRAPHQL_LIST_COST
+        ),
+    )
+
+    def dispatch(self, request, *args, **kwargs):
+        # The schema has no mutations: every operation can read from a replica.
+        with read_from_replica(request):
+            response = super().dispatch(request, *args, **kwargs)
+            cacheable = not replica_may_be_stale()
+        max_age = getattr(request, "graphql_max_age", 0)
+        if response.status_code == 200 and max_age > 0 and cacheable:
+            patch_cache_control(response, public=True, max_age=max_age)
+        return response
+
+    def get_persisted_query_hash(self, request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                return None
+        if not isinstance(extensions, dict):
+            return None
+        persisted_query = extensions.get("persistedQuery") or {}
+        return persisted_query.get("sha256Hash")
+
+    def resolve_query(self, request, data, query):
+        """
+        Return the (sha256 hash, query text) pair for the request. A client
+        sending both registers the query; one sending only the hash gets the
+        text looked up from the document cache or Redis later.
+        """
+        query_hash = self.get_persisted_query_hash(request, data)
+
+        if query:
+            digest = hashlib.sha256(query.encode("utf-8")).hexdigest()
+            if query_hash and query_hash != digest:
+                raise GraphQLError(
+                    "provided sha does not match query",
+                    extensions={"code": "PERSISTED_QUERY_HASH_MISMATCH"},
+                )
+            if query_hash:
+                set_persisted_query(digest, query)
+            return digest, query
+
+        if not query_hash:
+            return None, None
+        return query_hash, None
+
+    def get_document(self, query_hash, query, operation_name):
+        entry = document_cache.get(query_hash)
+        if entry is not None:
+            return entry
+
+        if query is None:
+            query = get_persisted_query(query_hash)
+        if query is None:
+            return None, [
+                GraphQLError(
+                    "PersistedQueryNotFound",
+                    extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+                )
+            ]
+
+        start = time.perf_counter()
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+        parse_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        errors = validate(self.schema.graphql_schema, document, self.validation_rules)
+        validate_time = time.perf_counter() - start
+
+        # Invalid documents share one series; valid ones are labelled by
+        # operation name, within the limits of operation_labels.
+        label = (
+            "invalid" if errors else self.get_operation_label(document, operation_name)
+        )
+        graphql_phase_duration.labels(label, "parse").observe(parse_time)
+        graphql_phase_duration.labels(label, "validate").observe(validate_time)
+
+        entry = (document, errors)
+        document_cache.set(query_hash, entry)
+        return entry
+
+    def get_operation_label(self, document, operation_name):
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is None:
+            return "invalid"
+        if operation_ast.name is None:
+            return "anonymous"
+        return operation_labels.get(operation_ast.name.value)
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        try:
+            query_hash, query = self.resolve_query(request, data, query)
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        if query_hash is None:
+            return super().execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+
+        document, errors = self.get_document(query_hash, query, operation_name)
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        label = self.get_operation_label(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        max_age = 0
+        if operation_ast is not None and operation_ast.operation == OperationType.QUERY:
+            max_age = get_operation_max_age(
+                self.schema.graphql_schema,
+                document,
+                operation_ast,
+                default=settings.GRAPHQL_DEFAULT_MAX_AGE,
+            )
+
+        cache_key = None
+        if max_age > 0:
+            cache_key = self.get_result_cache_key(query_hash, operation_name, variables)
+        if cache_key is not None:
+            data = get_cached(cache_key)
+            if data is not None:
+                response_cache_hits.labels("graphql").inc()
+                request.graphql_max_age = max_age
+                return ExecutionResult(data=data)
+            response_cache_misses.labels("graphql").inc()
+
+        result = self.execute_document(
+            request, document, variables, operation_name, label
+        )
+        if not result.errors:
+            request.graphql_max_age = max_age
+            # A lagging replica may not have the write that bumped the
+            # version yet; its result must not be stored under it.
+            if cache_key is not None and not replica_may_be_stale():
+                set_cached(cache_key, result.data, timeout=max_age)
+        return result
+
+    def get_result_cache_key(self, query_hash, operation_name, variables):
+        version = get_catalog_version()
+        if version is None:
+            return None
+        raw = json.dumps(
+            [operation_name, variables or {}], sort_keys=True, separators=(",", ":")
+        )
+        digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+        return f"catalog:{version}:graphql:{query_hash}:{digest}"
+
+    def execute_document(self, request, document, variables, operation_name, label):
+        start = time.perf_counter()
+        try:
+            return execute(
+                self.schema.graphql_schema,
+                document,
+                root_value=self.get_root_value(request),
+                context_value=self.get_context(request),
+                variable_values=variables,
+                operation_name=operation_name,
+                middleware=self.get_middleware(request),
+            )
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        finally:
+            graphql_phase_duration.labels(label, "execute").observe(
+                time.perf_counter() - start
+            )
@@ -0,0 +1,99 @@
+import io
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "avif": "avif"}
+
+# S3 storage sets Content-Type from the extension; older Pythons lack AVIF.
+mimetypes.add_type("image/avif", ".avif")
+
+
+def get_formats():
+    """Configured variant formats that this Pillow build can encode."""
+    return [
+        fmt
+        for fmt in settings.PRODUCT_IMAGE_FORMATS
+        if fmt == "jpeg" or features.check(fmt)
+    ]
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(
+            buffer,
+            "JPEG",
+            quality=settings.PRODUCT_IMAGE_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+    elif fmt == "webp":
+        image.save(buffer, "WEBP", quality=settings.PRODUCT_IMAGE_QUALITY, method=4)
+    else:
+        image.save(buffer, fmt.upper(), quality=settings.PRODUCT_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    Resize the stored image ``name`` to every configured size and format and
+    store the results next to it. Returns the variants mapping saved on the
+    model: ``{"source": name, size: {format: stored name}}``.
+    """
+    root, _ = os.path.splitext(name)
+    sizes = sorted(
+        settings.PRODUCT_IMAGE_SIZES.items(), key=lambda item: item[1], reverse=True
+    )
+    formats = get_formats()
+    variants = {"source": name}
+
+    with storage.open(name, "rb") as file:
+        image = Image.open(file)
+        # Let JPEG decode at a reduced scale close to the largest variant.
+        image.draft("RGB", (sizes[0][1], sizes[0][1]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        image.load()
+
+    # Largest first, so every smaller size is resized from a smaller image.
+    for size_name, size in sizes:
+        image = image.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[size_name] = {}
+        for fmt in formats:
+            stored = storage.save(
+                f"{root}_{size_name}.{EXTENSIONS[fmt]}",
+                ContentFile(encode(image, fmt)),
+            )
+            variants[size_name][fmt] = stored
+
+    return variants
+
+
+def get_variant_urls(name, variants, storage, request=None):
+    """
+    URLs of the variants of the image stored as ``name``, or an empty dict
+    while they are missing or were generated for a previous image.
+    """
+    if not name or variants.get("source") != name:
+        return {}
+
+    urls = {}
+    for size_name, names in variants.items():
+        if size_name == "source":
+            continue
+        urls[size_name] = {}
+        for fmt, variant in names.items():
+            url = storage.url(variant)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[size_name][fmt] = url
+    return urls
@@ -0,0 +1,224 @@
+import codecs
+import csv
+import io
+import json
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import bump_catalog_version
+from .models import Product
+from .serializers import DUPLICATE_NAME_MESSAGE, check_product_keys
+
+IMPORT_CONTENT_TYPES = {"text/csv": "csv", "application/x-ndjson": "ndjson"}
+
+IMPORT_FIELDS = ["category", "name", "description", "price", "discount", "available"]
+
+COPY_SQL = (
+    "COPY main_product (category_id, name, image, image_variants, description, "
+    "price, available, created, updated, discount) FROM STDIN WITH (FORMAT csv)"
+)
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """Per-row checks of ProductSerializer that need no database access."""
+
+    category = serializers.IntegerField()
+    name = serializers.CharField(max_length=50)
+    description = serializers.CharField(
+        max_length=1000, required=False, allow_blank=True, default=""
+    )
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount = serializers.DecimalField(
+        max_digits=4, decimal_places=2, required=False, default=0
+    )
+    available = serializers.BooleanField(required=False, default=True)
+
+    def validate(self, data):
+        data["name"] = data["name"].strip()
+        data["description"] = data["description"].strip()
+
+        if data["price"] <= 0:
+            raise serializers.ValidationError(
+                {"price": "Price must be greater than 0."}
+            )
+
+        if data["discount"] < 0 or data["discount"] > 100:
+            raise serializers.ValidationError(
+                {"discount": "Discount must be between 0 and 100."}
+            )
+
+        if not data["name"]:
+            raise serializers.ValidationError({"name": "Product name cannot be empty."})
+
+        if not data["available"]:
+            raise serializers.ValidationError(
+                {
+                    "available": "If the product is unavailable, the price should not be specified."
+                }
+            )
+
+        return data
+
+
+def iter_rows(lines, fmt):
+    """Yield (row number, dict) pairs from an iterable of byte lines."""
+    text = codecs.iterdecode(lines, "utf-8")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, row
+    elif fmt == "ndjson":
+        number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, None
+                continue
+            yield number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+class ProductImporter:
+    """
+    Validate and load products in batches.
+
+    Field checks run per row without queries; category existence and
+    (name, category) uniqueness are checked with one query per batch.
+    Valid rows are written with Postgres COPY, or bulk_create on other
+    databases, in one short transaction per batch.
+    """
+
+    def __init__(self, batch_size=5000, max_errors=1000):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.created = 0
+        self.total = 0
+        self.failed = 0
+        self.errors = []
+        self.aborted = None
+
+    def run(self, rows):
+        batch = []
+        try:
+            for number, row in rows:
+                self.total += 1
+                batch.append((number, row))
+                if len(batch) >= self.batch_size:
+                    self.load_batch(batch)
+                    batch = []
+        except (UnicodeDecodeError, csv.Error) as e:
+            # Rows already loaded stay committed; report where the input broke.
+            self.aborted = f"Malformed input after row {self.total}: {str(e)}"
+        if batch:
+            self.load_batch(batch)
+
+        if self.created:
+            transaction.on_commit(bump_catalog_version)
+        return self.report()
+
+    def report(self):
+        return {
+            "total": self.total,
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "aborted": self.aborted,
+        }
+
+    def add_error(self, number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": number, "errors": errors})
+
+    def load_batch(self, batch):
+        # One serializer is reused for every row: building a new one per row
+        # deep-copies its fields and costs more than the validation itself.
+        serializer = ProductImportRowSerializer()
+        valid = []
+        for number, row in batch:
+            if row is None:
+                self.add_error(
+                    number, {"non_field_errors": ["Row is not a JSON object."]}
+                )
+                continue
+            data = {
+                field: row[field]
+                for field in IMPORT_FIELDS
+                if row.get(field) not in (None, "")
+            }
+            try:
+                valid.append((number, serializer.run_validation(data)))
+            except serializers.ValidationError as e:
+                self.add_error(number, serializers.as_serializer_error(e))
+
+        valid = self.check_database(valid)
+        if not valid:
+            return
+
+        try:
+            with transaction.atomic():
+                if connection.vendor == "postgresql":
+                    self.copy([data for _, data in valid])
+                else:
+                    Product.objects.bulk_create(
+                        [
+                            Product(category_id=data.pop("category"), **data)
+                            for _, data in valid
+                        ]
+                    )
+        except DatabaseError as e:
+            for number, _ in valid:
+                self.add_error(number, {"non_field_errors": [str(e)]})
+            return
+        self.created += len(valid)
+
+    def check_database(self, valid):
+        existing_categories, existing_products = check_product_keys(
+            {(data["name"], data["category"]) for _, data in valid}
+        )
+
+        checked = []
+        seen = set()
+        for number, data in valid:
+            key = (data["name"], data["category"])
+            if data["category"] not in existing_categories:
+                self.add_error(
+                    number, {"category": ["The specified category does not exist."]}
+                )
+            elif key in existing_products or key in seen:
+                self.add_error(number, {"name": [DUPLICATE_NAME_MESSAGE]})
+            else:
+                seen.add(key)
+                checked.append((number, data))
+        return checked
+
+    def copy(self, rows):
+        now = timezone.now().isoformat()
+        buffer = io.StringIO()
+        # Quote every field: COPY reads an unquoted empty field as NULL.
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for data in rows:
+            writer.writerow(
+                [
+                    data["category"],
+                    data["name"],
+                    "",
+                    "{}",
+                    data["description"],
+                    data["price"],
+                    data["available"],
+                    now,
+                    now,
+                    data["discount"],
+                ]
+            )
+        buffer.seek(0)
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            cursor.copy_expert(COPY_SQL, buffer)
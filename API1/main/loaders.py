@@ -0,0 +1,114 @@
+from collections import defaultdict
+
+from .models import Category, Product, ProductImage
+
+
+class Loader:
+    """
+    Per-request batching loader for synchronous GraphQL execution.
+
+    Resolvers of a list field ``prime`` the keys their children will ask for.
+    The first ``load`` then fetches every queued key in a single query, so each
+    nesting level costs one query however many rows it has.
+    """
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self.cache = {}
+        self.queue = set()
+
+    def batch_load(self, keys):
+        raise NotImplementedError
+
+    def default(self):
+        return None
+
+    def prime(self, keys):
+        self.queue.update(key for key in keys if key not in self.cache)
+
+    def seed(self, objects):
+        for obj in objects:
+            self.cache.setdefault(obj.pk, obj)
+
+    def load(self, key):
+        if key not in self.cache:
+            self.queue.add(key)
+            keys = list(self.queue)
+            self.queue.clear()
+            results = self.batch_load(keys)
+            for batch_key in keys:
+                self.cache[batch_key] = results.get(batch_key, self.default())
+        return self.cache[key]
+
+
+class CategoryLoader(Loader):
+    def batch_load(self, keys):
+        categories = Category.objects.in_bulk(keys)
+        self.loaders.prime_categories(categories.values())
+        return categories
+
+
+class ProductLoader(Loader):
+    def batch_load(self, keys):
+        products = Product.objects.in_bulk(keys)
+        self.loaders.prime_products(products.values())
+        return products
+
+
+class ProductsByCategoryLoader(Loader):
+    def default(self):
+        return []
+
+    def batch_load(self, keys):
+        products = list(Product.objects.filter(category_id__in=keys).order_by("id"))
+        self.loaders.prime_products(products)
+        grouped = defaultdict(list)
+        for product in products:
+            grouped[product.category_id].append(product)
+        return grouped
+
+
+class ImagesByProductLoader(Loader):
+    def default(self):
+        return []
+
+    def batch_load(self, keys):
+        images = list(ProductImage.objects.filter(product_id__in=keys).order_by("id"))
+        self.loaders.prime_images(images)
+        grouped = defaultdict(list)
+        for image in images:
+            grouped[image.product_id].append(image)
+        return grouped
+
+
+class Loaders:
+    def __init__(self):
+        self.category = CategoryLoader(self)
+        self.product = ProductLoader(self)
+        self.products_by_category = ProductsByCategoryLoader(self)
+        self.images_by_product = ImagesByProductLoader(self)
+
+    def prime_categories(self, categories):
+        categories = list(categories)
+        self.category.seed(categories)
+        self.products_by_category.prime(category.id for category in categories)
+
+    def prime_products(self, products):
+        products = list(products)
+        self.product.seed(products)
+        self.category.prime(product.category_id for product in products)
+        self.images_by_product.prime(product.id for product in products)
+
+    def prime_images(self, images):
+        self.product.prime(image.product_id for image in images)
+
+
+def get_loaders(info):
+    context = info.context
+    if context is None:
+        return Loaders()
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
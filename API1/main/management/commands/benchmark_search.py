@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from main.benchmark import add_arguments, measure, seed_products
+from main.models import Product
+from main.search import search_products
+
+
+class Command(BaseCommand):
+    help = "Compare icontains and full-text product search latency"
+
+    def add_arguments(self, parser):
+        add_arguments(parser, rows=1_000_000)
+        parser.add_argument("--limit", type=int, default=50)
+        parser.add_argument(
+            "terms", nargs="*", default=["apple", "fresh juice", "chese"]
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self.seed(options["rows"])
+
+        limit = options["limit"]
+        self.stdout.write(f"Products: {Product.objects.count()}")
+        for term in options["terms"]:
+            legacy = Product.objects.filter(name__icontains=term).order_by("-id")
+            ranked = search_products(Product.objects.all(), term).order_by(
+                "-search_rank", "-id"
+            )
+            legacy_ms = measure(lambda: list(legacy[:limit]), options["repeat"])
+            ranked_ms = measure(lambda: list(ranked[:limit]), options["repeat"])
+            self.stdout.write(
+                f"{term!r}: icontains {legacy_ms:.1f} ms, "
+                f"full-text {ranked_ms:.1f} ms"
+            )
+
+    def seed(self, rows):
+        inserted = seed_products(rows)
+        if inserted:
+            self.stdout.write(f"Inserted {inserted} products")
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from main.benchmark import add_arguments, measure, seed_products
+from main.models import Product
+from main.serializers import ProductSerializer, ProductValuesSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare product list serialization with and without model instances"
+
+    def add_arguments(self, parser):
+        add_arguments(parser, rows=10_000)
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            inserted = seed_products(options["rows"])
+            if inserted:
+                self.stdout.write(f"Inserted {inserted} products")
+
+        rows = options["rows"]
+        queryset = Product.objects.order_by("-created", "-id")
+        if queryset.count() < rows:
+            raise CommandError(
+                f"Only {queryset.count()} products exist, run with --seed."
+            )
+
+        # Image URLs are absolute whenever the list view has a request.
+        request = APIRequestFactory().get("/api/v1/product/")
+        context = {"request": request}
+        renderer = JSONRenderer()
+
+        def serialize_models():
+            products = list(queryset[:rows])
+            data = ProductSerializer(products, many=True, context=context).data
+            return renderer.render(data)
+
+        def serialize_values():
+            products = list(ProductValuesSerializer.values(queryset)[:rows])
+            data = ProductValuesSerializer(context).serialize(products)
+            return renderer.render(data)
+
+        if serialize_models() != serialize_values():
+            raise CommandError("The two serializers rendered different JSON.")
+
+        self.stdout.write(f"Rows: {rows}")
+        for label, serialize in (
+            ("ProductSerializer", serialize_models),
+            ("ProductValuesSerializer", serialize_values),
+        ):
+            ms = measure(serialize, options["repeat"])
+            self.stdout.write(f"{label}: {ms:.1f} ms, {rows / ms * 1000:,.0f} rows/s")
@@ -0,0 +1,83 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.benchmark import add_arguments, measure, seed_products
+from main.models import Product
+from main.snapshot import ARRAYS, CatalogSnapshot
+
+# (label, ProductFilter values, ordering)
+QUERIES = [
+    ("newest", {}, "-created"),
+    ("available, cheapest", {"available": True}, "sell_price"),
+    (
+        "price 50-150, priciest",
+        {"price_min": Decimal("50"), "price_max": Decimal("150")},
+        "-sell_price",
+    ),
+    (
+        "discount 20+, available, newest",
+        {"discount_min": Decimal("20"), "available": True},
+        "-created",
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare filtered product list pages from the ORM and the NumPy snapshot"
+
+    def add_arguments(self, parser):
+        add_arguments(parser, rows=1_000_000)
+        parser.add_argument("--limit", type=int, default=50)
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            inserted = seed_products(options["rows"])
+            if inserted:
+                self.stdout.write(f"Inserted {inserted} products")
+
+        start = time.perf_counter()
+        snapshot = CatalogSnapshot.load(version=None)
+        load_ms = (time.perf_counter() - start) * 1000
+        size = sum(getattr(snapshot, name).nbytes for name in ARRAYS)
+        self.stdout.write(
+            f"Products: {len(snapshot)}, snapshot load {load_ms:.0f} ms, "
+            f"{size / 1024 / 1024:.1f} MB"
+        )
+
+        limit = options["limit"] + 1
+        for label, filters, ordering in QUERIES:
+            field = ordering.lstrip("-")
+            descending = ordering.startswith("-")
+            queryset = self.filter(Product.objects.all(), filters).order_by(
+                ordering, f"{'-' if descending else ''}id"
+            )
+            orm_ids = list(queryset.values_list("id", flat=True)[:limit])
+            snapshot_ids = snapshot.get_ids(filters, field, descending, None, limit)
+            if orm_ids != snapshot_ids:
+                raise CommandError(f"{label}: the snapshot returned other ids.")
+
+            orm_ms = measure(
+                lambda: list(queryset.values_list("id", flat=True)[:limit]),
+                options["repeat"],
+            )
+            snapshot_ms = measure(
+                lambda: snapshot.get_ids(filters, field, descending, None, limit),
+                options["repeat"],
+            )
+            self.stdout.write(
+                f"{label}: ORM {orm_ms:.1f} ms, snapshot {snapshot_ms:.1f} ms"
+            )
+
+    def filter(self, queryset, filters):
+        lookups = {
+            "available": "available",
+            "price_min": "sell_price__gte",
+            "price_max": "sell_price__lte",
+            "discount_min": "discount__gte",
+            "discount_max": "discount__lte",
+        }
+        return queryset.filter(
+            **{lookups[name]: value for name, value in filters.items()}
+        )
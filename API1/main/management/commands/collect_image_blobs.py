@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from main.blobs import collect_blobs
+
+
+class Command(BaseCommand):
+    help = "Delete image blobs that no product or product image references"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        deleted = collect_blobs(batch_size=options["batch_size"])
+        self.stdout.write(f"Deleted {deleted} unreferenced image blobs.")
@@ -0,0 +1,45 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importer import ProductImporter, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import products from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"]
+        if fmt is None:
+            if path.endswith(".csv"):
+                fmt = "csv"
+            elif path.endswith((".ndjson", ".jsonl")):
+                fmt = "ndjson"
+            else:
+                raise CommandError("Cannot infer the format, pass --format.")
+
+        importer = ProductImporter(batch_size=options["batch_size"])
+        if path == "-":
+            report = importer.run(iter_rows(sys.stdin.buffer, fmt))
+        else:
+            try:
+                with open(path, "rb") as lines:
+                    report = importer.run(iter_rows(lines, fmt))
+            except OSError as e:
+                raise CommandError(str(e))
+
+        for error in report["errors"]:
+            self.stderr.write(json.dumps(error))
+        self.stdout.write(
+            f"Imported {report['created']} of {report['total']} rows, "
+            f"{report['failed']} failed."
+        )
+        if report["aborted"]:
+            raise CommandError(report["aborted"])
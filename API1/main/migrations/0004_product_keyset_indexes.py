@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:34
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0003_remove_category_slug_remove_product_slug"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["-created", "-id"], name="product_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "-created", "-id"],
+                name="product_cat_created_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                django.db.models.expressions.CombinedExpression(
+                    models.F("price"),
+                    "-",
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.expressions.CombinedExpression(
+                            models.F("price"), "*", models.F("discount")
+                        ),
+                        "/",
+                        models.Value(100),
+                    ),
+                ),
+                models.F("id"),
+                name="product_sell_price_id_idx",
+            ),
+        ),
+    ]
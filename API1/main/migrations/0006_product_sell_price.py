@@ -0,0 +1,50 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:37
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0005_product_search"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_sell_price_id_idx",
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="sell_price",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.CombinedExpression(
+                    models.F("price"),
+                    "-",
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.expressions.CombinedExpression(
+                            models.F("price"), "*", models.F("discount")
+                        ),
+                        "/",
+                        models.Value(100),
+                    ),
+                ),
+                output_field=models.DecimalField(decimal_places=2, max_digits=10),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["sell_price", "id"], name="product_sell_price_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["available", "sell_price", "id"],
+                name="product_avail_sell_price_idx",
+            ),
+        ),
+    ]
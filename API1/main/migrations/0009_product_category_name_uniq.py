@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+# Rows that break the new constraint keep the oldest product's name; the
+# others get their id appended, cut to fit the 50 character column.
+RENAME_DUPLICATES = """
+UPDATE main_product AS p
+SET name = left(p.name, 50 - length(p.id::text) - 2) || ' #' || p.id
+FROM (
+    SELECT id, row_number() OVER (
+        PARTITION BY category_id, name ORDER BY id
+    ) AS position
+    FROM main_product
+) AS d
+WHERE p.id = d.id AND d.position > 1
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0008_image_blob"),
+    ]
+
+    operations = [
+        migrations.RunSQL(RENAME_DUPLICATES, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.UniqueConstraint(
+                fields=("category", "name"),
+                name="product_category_name_uniq",
+                violation_error_message="A product with this name already exists in this category.",
+            ),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+# Every write to a product or category upserts its row in the change log at
+# commit time. The advisory lock makes commits that touch the catalog take
+# their sequence numbers one after another, so a number is never visible
+# before every smaller one is.
+CHANGE_TRIGGERS = """
+CREATE SEQUENCE main_catalogchange_seq;
+
+CREATE FUNCTION main_record_catalog_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('main_catalogchange'));
+    INSERT INTO main_catalogchange (seq, model, object_id, deleted, changed)
+    VALUES (
+        nextval('main_catalogchange_seq'),
+        TG_ARGV[0],
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+        TG_OP = 'DELETE',
+        clock_timestamp()
+    )
+    ON CONFLICT (model, object_id) DO UPDATE
+    SET seq = EXCLUDED.seq, deleted = EXCLUDED.deleted, changed = EXCLUDED.changed;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER main_product_catalog_change
+AFTER INSERT OR UPDATE OR DELETE ON main_product
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION main_record_catalog_change('product');
+
+CREATE CONSTRAINT TRIGGER main_category_catalog_change
+AFTER INSERT OR UPDATE OR DELETE ON main_category
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION main_record_catalog_change('category');
+
+INSERT INTO main_catalogchange (seq, model, object_id, deleted, changed)
+SELECT nextval('main_catalogchange_seq'), 'category', id, false, clock_timestamp()
+FROM main_category ORDER BY id;
+
+INSERT INTO main_catalogchange (seq, model, object_id, deleted, changed)
+SELECT nextval('main_catalogchange_seq'), 'product', id, false, clock_timestamp()
+FROM main_product ORDER BY id;
+"""
+
+DROP_CHANGE_TRIGGERS = """
+DROP TRIGGER main_category_catalog_change ON main_category;
+DROP TRIGGER main_product_catalog_change ON main_product;
+DROP FUNCTION main_record_catalog_change();
+DROP SEQUENCE main_catalogchange_seq;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0009_product_category_name_uniq"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("seq", models.BigIntegerField(unique=True)),
+                (
+                    "model",
+                    models.CharField(
+                        choices=[("product", "Product"), ("category", "Category")],
+                        max_length=16,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("deleted", models.BooleanField(default=False)),
+                ("changed", models.DateTimeField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model", "object_id"), name="catalog_change_object_uniq"
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(CHANGE_TRIGGERS, DROP_CHANGE_TRIGGERS),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0010_catalog_change"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryDeletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("category_id", models.BigIntegerField(db_index=True)),
+                ("name", models.CharField(max_length=25)),
+                ("total", models.PositiveIntegerField()),
+                ("deleted", models.PositiveIntegerField(default=0)),
+                ("files_deleted", models.PositiveIntegerField(default=0)),
+                ("started", models.DateTimeField(auto_now_add=True)),
+                ("finished", models.DateTimeField(blank=True, null=True)),
+                ("error", models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="hidden",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
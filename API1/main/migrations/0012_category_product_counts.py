@@ -0,0 +1,95 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+# (category_id, total, available) changes made by one statement, read from
+# its transition tables.
+INSERTED = "SELECT category_id, 1 AS total, available::int AS available FROM new_rows"
+DELETED = "SELECT category_id, -1 AS total, -available::int AS available FROM old_rows"
+
+# Counters change once per statement and category, so a batch of writes
+# costs one update per category instead of one per row. The categories
+# are locked in id order first, so two batches cannot deadlock.
+UPDATE_COUNTS = """
+        PERFORM 1 FROM main_category
+        WHERE id IN (
+            SELECT category_id FROM ({rows}) AS r
+            GROUP BY category_id
+            HAVING sum(total) <> 0 OR sum(available) <> 0
+        )
+        ORDER BY id
+        FOR NO KEY UPDATE;
+        UPDATE main_category AS c
+        SET product_count = c.product_count + d.total,
+            available_count = c.available_count + d.available
+        FROM (
+            SELECT category_id, sum(total) AS total, sum(available) AS available
+            FROM ({rows}) AS r
+            GROUP BY category_id
+        ) AS d
+        WHERE c.id = d.category_id AND (d.total <> 0 OR d.available <> 0);
+"""
+
+COUNT_TRIGGERS = f"""
+CREATE FUNCTION main_count_category_products() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+{UPDATE_COUNTS.format(rows=INSERTED)}
+    ELSIF TG_OP = 'DELETE' THEN
+{UPDATE_COUNTS.format(rows=DELETED)}
+    ELSE
+{UPDATE_COUNTS.format(rows=f"{INSERTED} UNION ALL {DELETED}")}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER main_product_count_insert
+AFTER INSERT ON main_product REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_count_category_products();
+
+CREATE TRIGGER main_product_count_update
+AFTER UPDATE ON main_product REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_count_category_products();
+
+CREATE TRIGGER main_product_count_delete
+AFTER DELETE ON main_product REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_count_category_products();
+
+UPDATE main_category AS c
+SET product_count = d.total, available_count = d.available
+FROM (
+    SELECT category_id, count(*) AS total, count(*) FILTER (WHERE available) AS available
+    FROM main_product
+    GROUP BY category_id
+) AS d
+WHERE c.id = d.category_id;
+"""
+
+DROP_COUNT_TRIGGERS = """
+DROP TRIGGER main_product_count_insert ON main_product;
+DROP TRIGGER main_product_count_update ON main_product;
+DROP TRIGGER main_product_count_delete ON main_product;
+DROP FUNCTION main_count_category_products();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0011_category_deletion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="available_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="product_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(COUNT_TRIGGERS, DROP_COUNT_TRIGGERS),
+    ]
@@ -0,0 +1,131 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+# One set-based upsert per statement, read from its transition table, marks
+# the changed rows with a NULL seq. The first statement of a transaction
+# also adds it to main_catalogchange_pending, whose deferred trigger numbers
+# all of the transaction's rows at commit time, once. Only that step takes
+# the advisory lock, so sequence numbers are still taken in commit order
+# and a number is never visible before every smaller one is.
+STATEMENT_TRIGGERS = """
+DROP TRIGGER main_category_catalog_change ON main_category;
+DROP TRIGGER main_product_catalog_change ON main_product;
+DROP FUNCTION main_record_catalog_change();
+
+CREATE UNLOGGED TABLE main_catalogchange_pending (txid bigint PRIMARY KEY);
+
+CREATE FUNCTION main_record_catalog_changes() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO main_catalogchange (seq, model, object_id, deleted, changed)
+    SELECT NULL, TG_ARGV[0], id, TG_OP = 'DELETE', clock_timestamp()
+    FROM changed_rows
+    ORDER BY id
+    ON CONFLICT (model, object_id) DO UPDATE
+    SET seq = NULL, deleted = EXCLUDED.deleted, changed = EXCLUDED.changed;
+    IF FOUND THEN
+        INSERT INTO main_catalogchange_pending VALUES (txid_current())
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION main_number_catalog_changes() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('main_catalogchange'));
+    UPDATE main_catalogchange AS c
+    SET seq = nextval('main_catalogchange_seq'), changed = clock_timestamp()
+    FROM (
+        SELECT id FROM main_catalogchange WHERE seq IS NULL ORDER BY model, object_id
+    ) AS p
+    WHERE c.id = p.id;
+    DELETE FROM main_catalogchange_pending WHERE txid = NEW.txid;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER main_catalogchange_pending_number
+AFTER INSERT ON main_catalogchange_pending
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION main_number_catalog_changes();
+
+CREATE TRIGGER main_product_catalog_change_insert
+AFTER INSERT ON main_product REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_record_catalog_changes('product');
+
+CREATE TRIGGER main_product_catalog_change_update
+AFTER UPDATE ON main_product REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_record_catalog_changes('product');
+
+CREATE TRIGGER main_product_catalog_change_delete
+AFTER DELETE ON main_product REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_record_catalog_changes('product');
+
+CREATE TRIGGER main_category_catalog_change_insert
+AFTER INSERT ON main_category REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_record_catalog_changes('category');
+
+CREATE TRIGGER main_category_catalog_change_update
+AFTER UPDATE ON main_category REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_record_catalog_changes('category');
+
+CREATE TRIGGER main_category_catalog_change_delete
+AFTER DELETE ON main_category REFERENCING OLD TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_record_catalog_changes('category');
+"""
+
+ROW_TRIGGERS = """
+DROP TRIGGER main_category_catalog_change_insert ON main_category;
+DROP TRIGGER main_category_catalog_change_update ON main_category;
+DROP TRIGGER main_category_catalog_change_delete ON main_category;
+DROP TRIGGER main_product_catalog_change_insert ON main_product;
+DROP TRIGGER main_product_catalog_change_update ON main_product;
+DROP TRIGGER main_product_catalog_change_delete ON main_product;
+DROP FUNCTION main_record_catalog_changes();
+DROP TABLE main_catalogchange_pending;
+DROP FUNCTION main_number_catalog_changes();
+
+CREATE FUNCTION main_record_catalog_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('main_catalogchange'));
+    INSERT INTO main_catalogchange (seq, model, object_id, deleted, changed)
+    VALUES (
+        nextval('main_catalogchange_seq'),
+        TG_ARGV[0],
+        CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+        TG_OP = 'DELETE',
+        clock_timestamp()
+    )
+    ON CONFLICT (model, object_id) DO UPDATE
+    SET seq = EXCLUDED.seq, deleted = EXCLUDED.deleted, changed = EXCLUDED.changed;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER main_product_catalog_change
+AFTER INSERT OR UPDATE OR DELETE ON main_product
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION main_record_catalog_change('product');
+
+CREATE CONSTRAINT TRIGGER main_category_catalog_change
+AFTER INSERT OR UPDATE OR DELETE ON main_category
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION main_record_catalog_change('category');
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0012_category_product_counts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="catalogchange",
+            name="seq",
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+        migrations.RunSQL(STATEMENT_TRIGGERS, ROW_TRIGGERS),
+    ]
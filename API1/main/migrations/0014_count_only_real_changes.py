@@ -0,0 +1,126 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:46
+
+from importlib import import_module
+
+from django.db import migrations
+
+counts = import_module("main.migrations.0012_category_product_counts")
+
+# Updated products whose category or availability changed, old and new
+# values side by side. Other updates (price, name, ...) leave the counters
+# alone without being aggregated.
+MOVED = """
+    WITH moved AS (
+        SELECT n.category_id AS new_category_id, n.available AS new_available,
+            o.category_id AS old_category_id, o.available AS old_available
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.category_id <> o.category_id OR n.available <> o.available
+    )
+    SELECT new_category_id AS category_id, 1 AS total,
+        new_available::int AS available
+    FROM moved
+    UNION ALL
+    SELECT old_category_id, -1, -old_available::int FROM moved
+"""
+
+COUNT_FUNCTION = """
+CREATE OR REPLACE FUNCTION main_count_category_products() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+{inserted}
+    ELSIF TG_OP = 'DELETE' THEN
+{deleted}
+    ELSE
+{updated}
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+COUNT_CHANGED = COUNT_FUNCTION.format(
+    inserted=counts.UPDATE_COUNTS.format(rows=counts.INSERTED),
+    deleted=counts.UPDATE_COUNTS.format(rows=counts.DELETED),
+    updated=counts.UPDATE_COUNTS.format(rows=MOVED),
+)
+
+COUNT_ALL = COUNT_FUNCTION.format(
+    inserted=counts.UPDATE_COUNTS.format(rows=counts.INSERTED),
+    deleted=counts.UPDATE_COUNTS.format(rows=counts.DELETED),
+    updated=counts.UPDATE_COUNTS.format(
+        rows=f"{counts.INSERTED} UNION ALL {counts.DELETED}"
+    ),
+)
+
+# Upsert of the change log entries of {rows} (an id column), as in 0013.
+UPSERT_CHANGES = """
+        INSERT INTO main_catalogchange (seq, model, object_id, deleted, changed)
+        SELECT NULL, TG_ARGV[0], id, TG_OP = 'DELETE', clock_timestamp()
+        FROM ({rows}) AS r
+        ORDER BY id
+        ON CONFLICT (model, object_id) DO UPDATE
+        SET seq = NULL, deleted = EXCLUDED.deleted, changed = EXCLUDED.changed;
+"""
+
+PENDING = """
+    IF FOUND THEN
+        INSERT INTO main_catalogchange_pending VALUES (txid_current())
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Columns named after the model in the trigger arguments are ignored: an
+# update that changed nothing else is not a change for the feed. The
+# category counters change with every product write, and consumers read
+# them from the category itself.
+RECORD_CHANGES = f"""
+CREATE OR REPLACE FUNCTION main_record_catalog_changes() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND TG_NARGS > 1 THEN
+{UPSERT_CHANGES.format(rows='''
+            SELECT n.id FROM changed_rows n
+            JOIN old_rows o ON o.id = n.id
+            WHERE to_jsonb(n) - TG_ARGV[1:TG_NARGS - 1]
+                IS DISTINCT FROM to_jsonb(o) - TG_ARGV[1:TG_NARGS - 1]
+        ''')}
+    ELSE
+{UPSERT_CHANGES.format(rows="SELECT id FROM changed_rows")}
+    END IF;
+{PENDING}
+DROP TRIGGER main_category_catalog_change_update ON main_category;
+
+CREATE TRIGGER main_category_catalog_change_update
+AFTER UPDATE ON main_category
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_record_catalog_changes(
+    'category', 'product_count', 'available_count'
+);
+"""
+
+RECORD_ALL_CHANGES = f"""
+CREATE OR REPLACE FUNCTION main_record_catalog_changes() RETURNS trigger AS $$
+BEGIN
+{UPSERT_CHANGES.format(rows="SELECT id FROM changed_rows")}
+{PENDING}
+DROP TRIGGER main_category_catalog_change_update ON main_category;
+
+CREATE TRIGGER main_category_catalog_change_update
+AFTER UPDATE ON main_category REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION main_record_catalog_changes('category');
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0013_catalog_change_statement_triggers"),
+    ]
+
+    operations = [
+        migrations.RunSQL(COUNT_CHANGED, COUNT_ALL),
+        migrations.RunSQL(RECORD_CHANGES, RECORD_ALL_CHANGES),
+    ]
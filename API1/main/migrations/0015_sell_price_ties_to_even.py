@@ -0,0 +1,89 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:03
+
+import django.db.models.expressions
+import django.db.models.functions.math
+import django.db.models.lookups
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0014_count_only_real_changes"),
+    ]
+
+    operations = [
+        # A generated column cannot be altered: it is added again, with the
+        # indexes on it.
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_sell_price_id_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_avail_sell_price_idx",
+        ),
+        migrations.RemoveField(
+            model_name="product",
+            name="sell_price",
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="sell_price",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.CombinedExpression(
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.functions.math.Round(
+                            django.db.models.expressions.CombinedExpression(
+                                models.F("price"),
+                                "*",
+                                django.db.models.expressions.CombinedExpression(
+                                    models.Value(100), "-", models.F("discount")
+                                ),
+                            )
+                        ),
+                        "-",
+                        models.Case(
+                            models.When(
+                                django.db.models.lookups.Exact(
+                                    django.db.models.functions.math.Mod(
+                                        django.db.models.expressions.CombinedExpression(
+                                            models.F("price"),
+                                            "*",
+                                            django.db.models.expressions.CombinedExpression(
+                                                models.Value(100),
+                                                "-",
+                                                models.F("discount"),
+                                            ),
+                                        ),
+                                        2,
+                                    ),
+                                    Decimal("0.5"),
+                                ),
+                                then=1,
+                            ),
+                            default=0,
+                        ),
+                    ),
+                    "/",
+                    models.Value(100),
+                ),
+                output_field=models.DecimalField(decimal_places=2, max_digits=10),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["sell_price", "id"], name="product_sell_price_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["available", "sell_price", "id"],
+                name="product_avail_sell_price_idx",
+            ),
+        ),
+    ]
@@ -1,8 +1,39 @@
+from decimal import Decimal
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import Case, F, When
+from django.db.models.functions import Mod, Round
+from django.db.models.lookups import Exact
+
+# Sell price in cents before rounding. Exact: price and discount have two
+# decimal places.
+SELL_PRICE_CENTS = F("price") * (100 - F("discount"))
+
+
+class CategoryQuerySet(models.QuerySet):
+    def visible(self):
+        """Categories that are not being deleted in the background."""
+        return self.filter(hidden=False)
+
+
+class ProductQuerySet(models.QuerySet):
+    def visible(self):
+        """Products whose category is not being deleted in the background."""
+        return self.exclude(category__in=Category.objects.filter(hidden=True))
 
 
 class Category(models.Model):
     name = models.CharField(max_length=25, unique=True)
+    # Set when the category is deleted; its products are then removed in
+    # batches by delete_category_task.
+    hidden = models.BooleanField(default=False, editable=False)
+    # Kept up to date by database triggers on main_product.
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    available_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -14,27 +45,137 @@ class Product(models.Model):
     )
     name = models.CharField(max_length=50)
     image = models.ImageField(upload_to="products/%Y/%m/%d", blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     available = models.BooleanField(default=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     discount = models.DecimalField(default=0.00, max_digits=4, decimal_places=2)
+    # Rounded to cents with ties to even, as Decimal rounds in Python; a
+    # cast to numeric would round them away from zero.
+    sell_price = models.GeneratedField(
+        expression=(
+            Round(SELL_PRICE_CENTS)
+            - Case(
+                When(Exact(Mod(SELL_PRICE_CENTS, 2), Decimal("0.5")), then=1), default=0
+            )
+        )
+        / 100,
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", weight="A", config="english")
+        + SearchVector("description", weight="B", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created", "-id"], name="product_created_id_idx"),
+            models.Index(
+                fields=["category", "-created", "-id"],
+                name="product_cat_created_id_idx",
+            ),
+            models.Index(fields=["sell_price", "id"], name="product_sell_price_id_idx"),
+            models.Index(
+                fields=["available", "sell_price", "id"],
+                name="product_avail_sell_price_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="product_search_vector_idx"),
+            GinIndex(
+                OpClass("name", name="gin_trgm_ops"), name="product_name_trgm_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "name"],
+                name="product_category_name_uniq",
+                violation_error_message="A product with this name already exists in this category.",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
-    def sell_price(self):
-        if self.discount:
-            return round(self.price - self.price * self.discount / 100, 2)
-        return self.price
-
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
         Product, related_name="images", on_delete=models.CASCADE
     )
     image = models.ImageField(upload_to="products/%Y/%m/%d", blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.product.name} - {self.image.name}"
+
+
+class ImageBlob(models.Model):
+    """
+    An image stored once under its content hash and shared by every
+    Product/ProductImage that uploaded the same bytes.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    variants = models.JSONField(default=dict, blank=True)
+    ref_count = models.IntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    released = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+
+class CategoryDeletion(models.Model):
+    """
+    Progress of a category deleted in the background. Kept after the
+    category row is gone, so ``category_id`` is not a foreign key.
+    """
+
+    category_id = models.BigIntegerField(db_index=True)
+    name = models.CharField(max_length=25)
+    total = models.PositiveIntegerField()
+    deleted = models.PositiveIntegerField(default=0)
+    files_deleted = models.PositiveIntegerField(default=0)
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.deleted}/{self.total})"
+
+
+class CatalogChange(models.Model):
+    """
+    Latest change of each product and category, written by database
+    triggers. ``seq`` grows in commit order, so a client that has seen every
+    change up to some ``seq`` never misses one below it. It is only NULL
+    until the writing transaction commits, so readers never see that.
+    Deleted rows stay as tombstones.
+    """
+
+    PRODUCT = "product"
+    CATEGORY = "category"
+    MODEL_CHOICES = [(PRODUCT, "Product"), (CATEGORY, "Category")]
+
+    seq = models.BigIntegerField(unique=True, null=True)
+    model = models.CharField(max_length=16, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "object_id"], name="catalog_change_object_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.seq} {self.model} {self.object_id}"
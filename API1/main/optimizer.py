@@ -0,0 +1,86 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def collect_selections(info, selection_sets):
+    """Map each selected field name to the child selection sets it carries."""
+    selections = {}
+    pending = list(selection_sets)
+    while pending:
+        selection_set = pending.pop()
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                children = selections.setdefault(
+                    to_snake_case(selection.name.value), []
+                )
+                if selection.selection_set is not None:
+                    children.append(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                pending.append(info.fragments[selection.name.value].selection_set)
+            elif isinstance(selection, InlineFragmentNode):
+                pending.append(selection.selection_set)
+    return selections
+
+
+def project(model, info, selection_sets, prefix=""):
+    """
+    Translate a selection set on ``model`` into only() fields, select_related
+    paths and Prefetch objects, all relative to the root queryset via prefix.
+    """
+    # Keys are always loaded so the GraphQL loaders can batch by them.
+    only = [
+        f"{prefix}{field.attname}"
+        for field in model._meta.concrete_fields
+        if field.primary_key or field.is_relation
+    ]
+    select_related = []
+    prefetch = []
+
+    for name, children in collect_selections(info, selection_sets).items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+
+        if not field.is_relation:
+            only.append(f"{prefix}{field.attname}")
+        elif field.many_to_one or (field.one_to_one and field.concrete):
+            only.append(f"{prefix}{field.attname}")
+            select_related.append(f"{prefix}{name}")
+            nested = project(field.related_model, info, children, f"{prefix}{name}__")
+            only.extend(nested[0])
+            select_related.extend(nested[1])
+            prefetch.extend(nested[2])
+        elif field.one_to_many:
+            queryset = optimize_queryset(
+                field.related_model._default_manager.order_by("id"),
+                info,
+                children,
+                extra_fields=[field.field.attname],
+            )
+            prefetch.append(
+                Prefetch(f"{prefix}{field.get_accessor_name()}", queryset=queryset)
+            )
+
+    return only, select_related, prefetch
+
+
+def optimize_queryset(queryset, info, selection_sets=None, extra_fields=()):
+    """
+    Restrict ``queryset`` to the columns and relations the GraphQL query
+    asks for. Defaults to the selection of the field being resolved.
+    """
+    if selection_sets is None:
+        selection_sets = [node.selection_set for node in info.field_nodes]
+    only, select_related, prefetch = project(queryset.model, info, selection_sets)
+
+    queryset = queryset.only(*only, *extra_fields)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -0,0 +1,197 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor pagination over a unique (field, id) sort key.
+
+    Each page is fetched with a range condition on the index instead of an
+    OFFSET, so page N costs the same as page 1.
+    """
+
+    cursor_query_param = "cursor"
+    ordering_query_param = "ordering"
+    page_size_query_param = "page_size"
+    page_size = 50
+    max_page_size = 200
+    invalid_cursor_message = "Invalid cursor"
+
+    # ordering name -> (sort field, value parser)
+    orderings = {
+        "-created": ("created", parse_datetime),
+        "created": ("created", parse_datetime),
+        "-sell_price": ("sell_price", Decimal),
+        "sell_price": ("sell_price", Decimal),
+        "-relevance": ("search_rank", float),
+    }
+    default_ordering = "-created"
+    search_ordering = "-relevance"
+
+    def paginate_queryset(self, queryset, request, view=None, snapshot=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset)
+        self.field, parse_value = self.orderings[self.ordering]
+        self.descending = self.ordering.startswith("-")
+
+        cursor = self.decode_cursor(request, parse_value)
+        reverse = cursor is not None and cursor["reverse"]
+
+        if snapshot is not None:
+            results, has_more = self.get_snapshot_page(
+                queryset, snapshot, cursor, reverse
+            )
+        else:
+            queryset = queryset.order_by(*self.get_order_by(reverse))
+            if cursor is not None:
+                queryset = queryset.filter(
+                    self.get_range_filter(cursor["value"], cursor["id"], reverse)
+                )
+            results = list(queryset[: self.page_size + 1])
+            has_more = len(results) > self.page_size
+            results = results[: self.page_size]
+
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else cursor is not None
+        self.has_previous = has_more if reverse else cursor is not None
+        self.first, self.last = (results[0], results[-1]) if results else (None, None)
+        return results
+
+    def get_snapshot_page(self, queryset, snapshot, cursor, reverse):
+        """
+        Rows of the page whose ids the in-process snapshot picked, and
+        whether more follow. The rows are read from ``queryset`` by primary
+        key, so one that no longer matches its filters is left out.
+        """
+        ids = snapshot.get_ids(
+            self.field, self.descending != reverse, cursor, self.page_size + 1
+        )
+        has_more = len(ids) > self.page_size
+        ids = ids[: self.page_size]
+        rows = {
+            row["id"] if isinstance(row, dict) else row.pk: row
+            for row in queryset.filter(id__in=ids)
+        }
+        return [rows[pk] for pk in ids if pk in rows], has_more
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, queryset):
+        # Relevance is only available once a search has annotated the rank,
+        # and is the default order for search results.
+        searched = "search_rank" in queryset.query.annotations
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering in self.orderings and (
+            searched or ordering != self.search_ordering
+        ):
+            return ordering
+        return self.search_ordering if searched else self.default_ordering
+
+    def get_order_by(self, reverse):
+        descending = self.descending != reverse
+        prefix = "-" if descending else ""
+        return [f"{prefix}{self.field}", f"{prefix}id"]
+
+    def get_range_filter(self, value, pk, reverse):
+        # Rows strictly after (value, pk) in the direction being read. The
+        # redundant bound on the sort field lets Postgres use the index range.
+        if self.descending != reverse:
+            return Q(**{f"{self.field}__lte": value}) & (
+                Q(**{f"{self.field}__lt": value})
+                | Q(**{self.field: value, "id__lt": pk})
+            )
+        return Q(**{f"{self.field}__gte": value}) & (
+            Q(**{f"{self.field}__gt": value}) | Q(**{self.field: value, "id__gt": pk})
+        )
+
+    def decode_cursor(self, request, parse_value):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(encoded + padding))
+            if payload["o"] != self.ordering:
+                raise ValueError("Cursor does not match ordering")
+            value = parse_value(payload["v"])
+            if value is None:
+                raise ValueError("Invalid cursor value")
+            return {
+                "value": value,
+                "id": int(payload["i"]),
+                "reverse": bool(payload["r"]),
+            }
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        # Rows are model instances, or dicts on the .values() fast path.
+        if isinstance(obj, dict):
+            value, pk = obj[self.field], obj["id"]
+        else:
+            value, pk = getattr(obj, self.field), obj.pk
+        payload = {
+            "o": self.ordering,
+            "v": value.isoformat() if hasattr(value, "isoformat") else str(value),
+            "i": pk,
+            "r": int(reverse),
+        }
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        )
+        url = replace_query_param(
+            self.base_url, self.cursor_query_param, encoded.decode("ascii").rstrip("=")
+        )
+        return url
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        return self.encode_cursor(self.last, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first, reverse=True)
@@ -1,35 +1,92 @@
 import graphene
+from django.db import models
+from graphene_django.converter import convert_django_field
 from graphene_django.types import DjangoObjectType
-from .models import Product, Category
+from .models import Product, Category, ProductImage
+from .search import search_products
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+from .cache_control import cache_control
 
 
+@convert_django_field.register(models.GeneratedField)
+def convert_generated_field(field, registry=None):
+    return convert_django_field(field.output_field, registry)
+
+
+@cache_control(max_age=300)
+class ProductImageType(DjangoObjectType):
+    class Meta:
+        model = ProductImage
+        exclude = ("image_variants",)
+
+    def resolve_product(self, info):
+        if ProductImage.product.is_cached(self):
+            return self.product
+        return get_loaders(info).product.load(self.product_id)
+
+
+@cache_control(max_age=60)
 class ProductType(DjangoObjectType):
     class Meta:
         model = Product
+        exclude = ("search_vector", "image_variants")
+
+    def resolve_category(self, info):
+        if Product.category.is_cached(self):
+            return self.category
+        return get_loaders(info).category.load(self.category_id)
 
+    def resolve_images(self, info):
+        if "images" in getattr(self, "_prefetched_objects_cache", {}):
+            return self.images.all()
+        return get_loaders(info).images_by_product.load(self.id)
 
+
+@cache_control(max_age=300)
 class CategoryType(DjangoObjectType):
     class Meta:
         model = Category
+        exclude = ("hidden",)
+
+    def resolve_products(self, info):
+        if "products" in getattr(self, "_prefetched_objects_cache", {}):
+            return self.products.all()
+        return get_loaders(info).products_by_category.load(self.id)
 
 
 class Query(graphene.ObjectType):
-    all_products = graphene.List(ProductType)
+    all_products = graphene.List(ProductType, search=graphene.String())
     all_categories = graphene.List(CategoryType)
     product = graphene.Field(ProductType, id=graphene.Int())
     category = graphene.Field(CategoryType, id=graphene.Int())
 
-    def resolve_all_products(self, info):
-        return Product.objects.all()
+    @cache_control(max_age=60)
+    def resolve_all_products(self, info, search=None):
+        products = optimize_queryset(Product.objects.visible(), info)
+        if search:
+            products = search_products(products, search).order_by("-search_rank", "-id")
+        products = list(products)
+        get_loaders(info).prime_products(products)
+        return products
 
+    @cache_control(max_age=300)
     def resolve_all_categories(self, info):
-        return Category.objects.all()
+        categories = list(optimize_queryset(Category.objects.visible(), info))
+        get_loaders(info).prime_categories(categories)
+        return categories
 
+    @cache_control(max_age=60)
     def resolve_product(self, info, id):
-        return Product.objects.get(id=id)
+        product = optimize_queryset(Product.objects.visible(), info).get(id=id)
+        get_loaders(info).prime_products([product])
+        return product
 
+    @cache_control(max_age=300)
     def resolve_category(self, info, id):
-        return Category.objects.get(id=id)
+        category = optimize_queryset(Category.objects.visible(), info).get(id=id)
+        get_loaders(info).prime_categories([category])
+        return category
 
 
 schema = graphene.Schema(query=Query)
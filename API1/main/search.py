@@ -0,0 +1,40 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from rest_framework.filters import SearchFilter
+
+SEARCH_CONFIG = "english"
+
+
+def search_products(queryset, terms):
+    """
+    Filter products by full-text match on name/description or a fuzzy match
+    on name, annotating each row with a ``search_rank`` to order by.
+    """
+    terms = terms.strip()
+    if not terms:
+        return queryset
+
+    query = SearchQuery(terms, search_type="websearch", config=SEARCH_CONFIG)
+    return queryset.filter(
+        Q(search_vector=query) | Q(name__trigram_similar=terms)
+    ).annotate(
+        # Cast to double precision so the rank round-trips exactly through
+        # pagination cursors.
+        search_rank=Cast(
+            SearchRank(F("search_vector"), query) + TrigramSimilarity("name", terms),
+            output_field=FloatField(),
+        )
+    )
+
+
+class ProductSearchFilter(SearchFilter):
+    """DRF filter backend that sends ``?search=`` through the product search."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, "")
+        return search_products(queryset, terms.replace("\x00", ""))
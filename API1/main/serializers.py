@@ -1,22 +1,139 @@
-from rest_framework import serializers
-from .models import Product, Category
+from django.db import IntegrityError, transaction
+from django.db.models import FilteredRelation, Q
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .images import get_variant_urls
+from .models import Product, Category, CategoryDeletion
+
+VALUES_FIELDS = [
+    "id",
+    "sell_price",
+    "image_variants",
+    "name",
+    "image",
+    "description",
+    "price",
+    "available",
+    "created",
+    "updated",
+    "discount",
+    "category_id",
+]
+
+PRODUCT_UNIQUE_CONSTRAINT = "product_category_name_uniq"
+
+DUPLICATE_NAME_MESSAGE = "A product with this name already exists in this category."
+
+BATCH_FIELDS = [
+    "id",
+    "category",
+    "name",
+    "image",
+    "price",
+    "discount",
+    "sell_price",
+    "available",
+]
+
+
+def is_duplicate_product(error):
+    """Whether ``error`` was raised by the (category, name) constraint."""
+    diag = getattr(error.__cause__, "diag", None)
+    constraint = getattr(diag, "constraint_name", None) or str(error)
+    return PRODUCT_UNIQUE_CONSTRAINT in constraint
+
+
+def check_product_keys(keys):
+    """
+    Look up (name, category id) pairs with one query. Returns the ids of the
+    categories that exist and the pairs that are already taken.
+    """
+    names = {name for name, _ in keys}
+    rows = (
+        Category.objects.visible()
+        .filter(id__in={category for _, category in keys})
+        .annotate(
+            taken=FilteredRelation("products", condition=Q(products__name__in=names))
+        )
+        .values_list("id", "taken__name")
+    )
+    categories = set()
+    taken = set()
+    for category, name in rows:
+        categories.add(category)
+        if name is not None:
+            taken.add((name, category))
+    return categories, taken
 
 
 class ProductSerializer(serializers.ModelSerializer):
     sell_price = serializers.DecimalField(
         read_only=True, max_digits=10, decimal_places=2
     )
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.visible())
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = "__all__"
+        # Explicit, so declaring a field does not move its key.
+        fields = [
+            "id",
+            "sell_price",
+            "image_variants",
+            "name",
+            "image",
+            "description",
+            "price",
+            "available",
+            "created",
+            "updated",
+            "discount",
+            "category",
+        ]
+        # (category, name) is unique in the database; a violation is turned
+        # into the same error in create()/update() instead of queried first.
+        validators = []
+
+    def get_image_variants(self, obj):
+        return get_variant_urls(
+            obj.image.name,
+            obj.image_variants,
+            obj.image.storage,
+            self.context.get("request"),
+        )
+
+    def create(self, validated_data):
+        # The savepoint keeps an outer transaction usable after the error.
+        # sell_price comes back from the INSERT (RETURNING).
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError as e:
+            if not is_duplicate_product(e):
+                raise
+            raise serializers.ValidationError({"name": [DUPLICATE_NAME_MESSAGE]})
+
+    def update(self, instance, validated_data):
+        priced = (instance.price, instance.discount)
+        try:
+            with transaction.atomic():
+                instance = super().update(instance, validated_data)
+        except IntegrityError as e:
+            if not is_duplicate_product(e):
+                raise
+            raise serializers.ValidationError({"name": [DUPLICATE_NAME_MESSAGE]})
+        # sell_price is computed by the database, and an UPDATE does not
+        # return it; read it again only when its inputs changed.
+        if (instance.price, instance.discount) != priced:
+            instance.refresh_from_db(fields=["sell_price"])
+        return instance
 
     def validate(self, data):
         price = data.get("price")
         discount = data.get("discount")
         name = data.get("name", "").strip()
         description = data.get("description", "").strip()
-        category = data.get("category")
         image = data.get("image")
         available = data.get("available")
 
@@ -30,11 +147,6 @@ class ProductSerializer(serializers.ModelSerializer):
                 {"discount": "Discount must be between 0 and 100."}
             )
 
-        if Product.objects.filter(name=name, category=category).exists():
-            raise serializers.ValidationError(
-                {"name": "A product with this name already exists in this category."}
-            )
-
         if not name:
             raise serializers.ValidationError({"name": "Product name cannot be empty."})
 
@@ -43,11 +155,6 @@ class ProductSerializer(serializers.ModelSerializer):
                 {"description": "Description cannot exceed 1000 characters."}
             )
 
-        if category and not Category.objects.filter(id=category.id).exists():
-            raise serializers.ValidationError(
-                {"category": "The specified category does not exist."}
-            )
-
         if image:
             valid_extensions = ["jpg", "jpeg", "png"]
             ext = image.name.split(".")[-1].lower()
@@ -66,7 +173,158 @@ class ProductSerializer(serializers.ModelSerializer):
         return data
 
 
+class ProductBatchSerializer(serializers.ModelSerializer):
+    """Compact product representation for service-to-service lookups."""
+
+    sell_price = serializers.DecimalField(
+        read_only=True, max_digits=10, decimal_places=2
+    )
+
+    class Meta:
+        model = Product
+        fields = BATCH_FIELDS
+
+
+class ProductValuesSerializer:
+    """
+    Read-only fast path for product lists. Builds the same dicts as
+    ProductSerializer from ``.values()`` rows, without model instances or
+    a bound field per row, and resolves each image URL once.
+    """
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.request = self.context.get("request")
+        self.storage = Product._meta.get_field("image").storage
+        self.image_urls = {}
+        self.variant_urls = {}
+        self.converters = []
+
+        # Follow ProductSerializer's own fields so key order and value
+        # formatting (decimals, datetimes) stay identical.
+        for name, field in ProductSerializer(context=self.context).fields.items():
+            if name == "image":
+                self.converters.append((name, "image", self.get_image_url))
+            elif name == "image_variants":
+                self.converters.append((name, "image", None))
+            elif name == "category":
+                self.converters.append((name, "category_id", None))
+            elif isinstance(field, serializers.DecimalField):
+                self.converters.append((name, name, self.get_decimal(field)))
+            elif isinstance(field, serializers.DateTimeField):
+                self.converters.append((name, name, self.get_datetime(field)))
+            elif isinstance(
+                field,
+                (
+                    serializers.IntegerField,
+                    serializers.CharField,
+                    serializers.BooleanField,
+                ),
+            ):
+                self.converters.append((name, name, None))
+            else:
+                raise TypeError(f"No fast path for ProductSerializer.{name}")
+
+    @classmethod
+    def values(cls, queryset):
+        """Restrict ``queryset`` to the columns the fast path reads."""
+        columns = VALUES_FIELDS
+        if "search_rank" in queryset.query.annotations:
+            # The paginator builds relevance cursors from the rank.
+            columns = columns + ["search_rank"]
+        return queryset.values(*columns)
+
+    def get_decimal(self, field):
+        coerce_to_string = getattr(
+            field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING
+        )
+        if not coerce_to_string or field.localize:
+            return field.to_representation
+        exponent = -field.decimal_places
+
+        # Columns already come back at the field's scale, where quantizing is
+        # a no-op and the string form is all that is left to build.
+        def convert(value):
+            if value.as_tuple().exponent == exponent:
+                return format(value, "f")
+            return field.to_representation(value)
+
+        return convert
+
+    def get_datetime(self, field):
+        output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+        if output_format is None or output_format.lower() != ISO_8601:
+            return field.to_representation
+        # Resolve the active timezone once instead of once per value.
+        tz = getattr(field, "timezone", None) or field.default_timezone()
+        if tz is None:
+            return field.to_representation
+
+        def convert(value):
+            if not timezone.is_aware(value):
+                return field.to_representation(value)
+            value = value.astimezone(tz).isoformat()
+            if value.endswith("+00:00"):
+                value = value[:-6] + "Z"
+            return value
+
+        return convert
+
+    def get_image_url(self, name):
+        if not name:
+            return None
+        url = self.image_urls.get(name)
+        if url is None:
+            url = self.storage.url(name)
+            if self.request is not None:
+                url = self.request.build_absolute_uri(url)
+            self.image_urls[name] = url
+        return url
+
+    def get_image_variants(self, row):
+        name = row["image"]
+        if not name:
+            return {}
+        urls = self.variant_urls.get(name)
+        if urls is None:
+            urls = get_variant_urls(
+                name, row["image_variants"], self.storage, self.request
+            )
+            if urls:
+                # Only complete variants are shared between rows of a blob.
+                self.variant_urls[name] = urls
+        return urls
+
+    def to_representation(self, row):
+        data = {}
+        for name, column, convert in self.converters:
+            if name == "image_variants":
+                data[name] = self.get_image_variants(row)
+            else:
+                value = row[column]
+                data[name] = (
+                    value if convert is None or value is None else convert(value)
+                )
+        return data
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
+        fields = ["id", "name", "product_count", "available_count"]
+
+
+class CategoryDeletionSerializer(serializers.ModelSerializer):
+    status = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CategoryDeletion
         fields = "__all__"
+
+    def get_status(self, obj):
+        if obj.finished:
+            return "finished"
+        return "failed" if obj.error else "running"
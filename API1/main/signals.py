@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.conf import settings
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .models import Category, Product, ProductImage
+from .blobs import delete_upload, is_blob_name, release_blob
+from .tasks import collect_image_blobs_task, generate_image_variants_task
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_catalog_cache(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def schedule_image_variants(sender, instance, **kwargs):
+    name = instance.image.name
+    if not name or instance.image_variants.get("source") == name:
+        return
+    transaction.on_commit(
+        lambda: generate_image_variants_task.delay(
+            sender._meta.model_name, instance.pk, name
+        )
+    )
+
+
+def schedule_blob_collection():
+    transaction.on_commit(
+        lambda: collect_image_blobs_task.apply_async(
+            countdown=settings.PRODUCT_IMAGE_BLOB_GRACE
+        )
+    )
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=ProductImage)
+def remember_loaded_image(sender, instance, **kwargs):
+    # Compared with on save, so saving does not read the row again.
+    fields = instance.__dict__
+    if "image" in fields and "image_variants" in fields:
+        instance._loaded_image = (
+            getattr(fields["image"], "name", fields["image"]),
+            fields["image_variants"],
+        )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def remember_saved_image(sender, instance, **kwargs):
+    instance._loaded_image = (instance.image.name, instance.image_variants)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductImage)
+def release_replaced_image(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and "image" not in update_fields:
+        return
+    row = getattr(instance, "_loaded_image", None)
+    if row is None:
+        # Loaded with the image deferred.
+        row = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("image", "image_variants")
+            .first()
+        )
+    if row is None:
+        return
+    old, old_variants = row
+    if not old or old == instance.image.name:
+        return
+    if is_blob_name(old):
+        if release_blob(old):
+            schedule_blob_collection()
+    else:
+        # An upload not moved to a blob yet belongs to this row only.
+        transaction.on_commit(lambda: delete_upload(old, old_variants))
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+def release_deleted_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if not name:
+        return
+    if is_blob_name(name):
+        if release_blob(name):
+            schedule_blob_collection()
+    else:
+        variants = instance.image_variants
+        transaction.on_commit(lambda: delete_upload(name, variants))
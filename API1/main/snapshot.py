@@ -0,0 +1,384 @@
+import copy
+import datetime
+import io
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Max
+from django.utils.timezone import is_naive, make_aware
+from prometheus_client import Counter
+
+from .cache import get_catalog_version
+from .filters import ProductFilter
+from .models import CatalogChange, Category, Product
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Postgres converts prices and discounts to hundredths and creation times to
+# microseconds, and sends the rows as binary COPY, ordered by id.
+COPY_SQL = """
+COPY (
+    SELECT p.id, p.category_id, (p.sell_price * 100)::bigint,
+        (p.discount * 100)::bigint, p.available,
+        (EXTRACT(EPOCH FROM p.created) * 1000000)::bigint
+    FROM main_product p
+    JOIN main_category c ON c.id = p.category_id
+    WHERE NOT c.hidden{where}
+    ORDER BY p.id
+) TO STDOUT WITH (FORMAT binary)
+"""
+
+# CatalogSnapshot attributes holding one array per selected column.
+ARRAYS = ["ids", "categories", "prices", "discounts", "available", "created"]
+
+# Every binary COPY row has the same size here (no NULLs, fixed-width
+# types): a field count, then a length and a big-endian value per column.
+COPY_ROW = np.dtype(
+    [("fields", ">i2")]
+    + [
+        field
+        for name, kind in zip(ARRAYS, [">i8", ">i8", ">i8", ">i8", "?", ">i8"])
+        for field in ((f"{name}_size", ">i4"), (name, kind))
+    ]
+)
+# Signature, flags and header extension length; the trailer is a -1 count.
+COPY_HEADER = 19
+COPY_TRAILER = 2
+
+# Filters the snapshot can answer; any other active filter uses the ORM.
+SNAPSHOT_FILTERS = {
+    "price_min",
+    "price_max",
+    "discount_min",
+    "discount_max",
+    "available",
+}
+
+snapshot_queries = Counter(
+    "product_snapshot_queries_total",
+    "Product list pages by whether the in-process snapshot answered them.",
+    ["result"],
+)
+snapshot_refreshes = Counter(
+    "product_snapshot_refreshes_total",
+    "In-process catalog snapshot refreshes.",
+    ["kind"],
+)
+
+
+def to_cents(value, rounding=round):
+    """Hundredths of a decimal value, as the snapshot stores prices."""
+    return int(rounding(value * 100))
+
+
+def to_micros(value):
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+class CatalogSnapshot:
+    """
+    Columnar copy of the fields product lists filter and sort on, one NumPy
+    array per column, ordered by id. Prices and discounts are kept in
+    hundredths and creation times in microseconds, so comparisons are exact
+    integer operations. For each sort field the row order by (field, id) is
+    precomputed, so a page only scans rows from the cursor on until it is
+    full.
+    """
+
+    def __init__(self, seq, version, columns):
+        self.seq = seq
+        self.version = version
+        self.loaded = time.monotonic()
+        for name in ARRAYS:
+            setattr(self, name, columns[name])
+        self.sort_orders()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def sort_orders(self):
+        # sort field -> (row positions in (field, id) order, sorted field
+        # values, ids in the same order)
+        self.orders = {}
+        for field, keys in (("created", self.created), ("sell_price", self.prices)):
+            order = np.lexsort((self.ids, keys))
+            self.orders[field] = (order, keys[order], self.ids[order])
+
+    @classmethod
+    def load(cls, version):
+        # Changes committed while the rows are read are applied again by the
+        # next refresh, which is harmless.
+        db = router.db_for_read(Product)
+        seq = CatalogChange.objects.using(db).aggregate(seq=Max("seq"))["seq"] or 0
+        return cls(seq, version, read_columns(db))
+
+    def refresh(self, version):
+        """
+        Return a snapshot with the changes logged since this one was built,
+        or None when there are too many to apply one by one.
+        """
+        changes = list(
+            CatalogChange.objects.filter(seq__gt=self.seq)
+            .order_by("seq")
+            .values_list("seq", "model", "object_id")[
+                : settings.PRODUCT_SNAPSHOT_MAX_CHANGES + 1
+            ]
+        )
+        if len(changes) > settings.PRODUCT_SNAPSHOT_MAX_CHANGES:
+            return None
+
+        changed = {
+            object_id
+            for _, model, object_id in changes
+            if model == CatalogChange.PRODUCT
+        }
+        # The products of a category being deleted are hidden before their
+        # own rows change.
+        categories = {
+            object_id
+            for _, model, object_id in changes
+            if model == CatalogChange.CATEGORY
+        }
+        hidden = categories - set(
+            Category.objects.visible()
+            .filter(id__in=categories)
+            .values_list("id", flat=True)
+        )
+        seq = changes[-1][0] if changes else self.seq
+        if not changed and not hidden:
+            refreshed = copy.copy(self)
+            refreshed.seq = seq
+            refreshed.version = version
+            refreshed.loaded = time.monotonic()
+            return refreshed
+
+        # Drop every changed product, then add back those that still exist.
+        keep = ~np.isin(self.ids, np.fromiter(changed, dtype=np.int64))
+        keep &= ~np.isin(self.categories, np.fromiter(hidden, dtype=np.int64))
+        added = read_columns(router.db_for_read(Product), ids=changed)
+        order = np.argsort(
+            np.concatenate([self.ids[keep], added["ids"]]), kind="stable"
+        )
+        return CatalogSnapshot(
+            seq,
+            version,
+            {
+                name: np.concatenate([getattr(self, name)[keep], added[name]])[order]
+                for name in ARRAYS
+            },
+        )
+
+    def get_mask(self, rows, filters):
+        """Which of the row positions ``rows`` match ``filters``."""
+        mask = np.ones(len(rows), dtype=bool)
+        if filters.get("category") is not None:
+            mask &= self.categories[rows] == filters["category"]
+        if filters.get("available") is not None:
+            mask &= self.available[rows] == filters["available"]
+        if filters.get("price_min") is not None:
+            mask &= self.prices[rows] >= to_cents(filters["price_min"], math.ceil)
+        if filters.get("price_max") is not None:
+            mask &= self.prices[rows] <= to_cents(filters["price_max"], math.floor)
+        if filters.get("discount_min") is not None:
+            mask &= self.discounts[rows] >= to_cents(filters["discount_min"], math.ceil)
+        if filters.get("discount_max") is not None:
+            mask &= self.discounts[rows] <= to_cents(
+                filters["discount_max"], math.floor
+            )
+        return mask
+
+    def get_ids(self, filters, field, descending, cursor, limit):
+        """
+        Ids of the first ``limit`` products matching ``filters``, in keyset
+        order on (``field``, id), after ``cursor`` if given.
+        """
+        order, keys, ids = self.orders[field]
+
+        # Rows before ``position`` in (field, id) order come before the
+        # cursor, the others after it.
+        position = 0 if not descending else len(order)
+        if cursor is not None:
+            value = cursor["value"]
+            if field == "created":
+                value = to_micros(make_aware(value) if is_naive(value) else value)
+            else:
+                value = to_cents(value)
+            start = np.searchsorted(keys, value, side="left")
+            end = np.searchsorted(keys, value, side="right")
+            side = "left" if descending else "right"
+            position = start + np.searchsorted(ids[start:end], cursor["id"], side)
+
+        found = []
+        count = 0
+        size = limit * 4
+        while count < limit:
+            if descending:
+                if position <= 0:
+                    break
+                rows = order[max(position - size, 0) : position][::-1]
+                position -= len(rows)
+            else:
+                if position >= len(order):
+                    break
+                rows = order[position : position + size]
+                position += len(rows)
+            rows = rows[self.get_mask(rows, filters)]
+            found.append(rows)
+            count += len(rows)
+            # Selective filters: read bigger slices each round.
+            size *= 2
+
+        if not found:
+            return []
+        return self.ids[np.concatenate(found)[:limit]].tolist()
+
+
+def read_columns(db, ids=None):
+    """
+    The snapshot columns of the visible products (only those in ``ids`` if
+    given), ordered by id, as one NumPy array per column. The rows are
+    parsed straight from Postgres binary COPY, not built as Python objects.
+    """
+    buffer = io.BytesIO()
+    with connections[db].cursor() as cursor:
+        where = ""
+        if ids is not None:
+            where = cursor.mogrify(" AND p.id = ANY(%s)", [list(ids)]).decode()
+        cursor.copy_expert(COPY_SQL.format(where=where), buffer)
+
+    data = buffer.getbuffer()
+    offset = COPY_HEADER + int.from_bytes(data[COPY_HEADER - 4 : COPY_HEADER], "big")
+    rows = np.frombuffer(
+        data,
+        dtype=COPY_ROW,
+        offset=offset,
+        count=(len(data) - offset - COPY_TRAILER) // COPY_ROW.itemsize,
+    )
+    # astype() copies into native byte order, so the buffer can be freed.
+    return {
+        name: rows[name].astype(bool if name == "available" else np.int64)
+        for name in ARRAYS
+    }
+
+
+class SnapshotQuery:
+    """A snapshot bound to the filters of one request, used by KeysetPagination."""
+
+    def __init__(self, snapshot, filters):
+        self.snapshot = snapshot
+        self.filters = filters
+
+    def get_ids(self, field, descending, cursor, limit):
+        return self.snapshot.get_ids(self.filters, field, descending, cursor, limit)
+
+
+lock = threading.Lock()
+current = None
+# Thread reading the whole catalog, while lists are answered by the ORM.
+loader = None
+
+
+def is_current(snapshot, version):
+    # Without a catalog version (cache down) only the age limit applies.
+    return (
+        snapshot is not None
+        and (version is None or snapshot.version == version)
+        and time.monotonic() - snapshot.loaded < settings.PRODUCT_SNAPSHOT_MAX_AGE
+    )
+
+
+def load_snapshot(version):
+    global current
+    try:
+        snapshot = CatalogSnapshot.load(version)
+    except Exception as e:
+        logging.error(f"Failed to load product snapshot: {str(e)}")
+        return
+    finally:
+        connections.close_all()
+    snapshot_refreshes.labels("full").inc()
+    with lock:
+        current = snapshot
+
+
+def start_loading(version):
+    """Read the whole catalog in a background thread, unless one already is."""
+    global loader
+    if loader is not None and loader.is_alive():
+        return
+    loader = threading.Thread(
+        target=load_snapshot, args=(version,), name="product-snapshot", daemon=True
+    )
+    loader.start()
+
+
+def get_snapshot():
+    """
+    This worker's snapshot, brought up to date first if the catalog version
+    moved or it is older than PRODUCT_SNAPSHOT_MAX_AGE. None if the snapshot
+    is disabled or cannot be refreshed. A full load (the first one, or after
+    more than PRODUCT_SNAPSHOT_MAX_CHANGES changes) runs in the background,
+    and returns None until it has finished.
+    """
+    global current
+    if not settings.PRODUCT_SNAPSHOT:
+        return None
+
+    version = get_catalog_version()
+    if is_current(current, version):
+        return current
+
+    with lock:
+        snapshot = current
+        if is_current(snapshot, version):
+            return snapshot
+        if snapshot is not None:
+            try:
+                refreshed = snapshot.refresh(version)
+            except Exception as e:
+                logging.error(f"Failed to refresh product snapshot: {str(e)}")
+                return None
+            if refreshed is not None:
+                snapshot_refreshes.labels("incremental").inc()
+                current = refreshed
+                return refreshed
+            # Too far behind to catch up change by change.
+            current = None
+        start_loading(version)
+        return None
+
+
+def get_snapshot_query(params, category=None):
+    """
+    A SnapshotQuery for a product list request with query ``params``, or
+    None if the request needs the ORM (search or unsupported filters).
+    """
+    if params.get("search"):
+        snapshot_queries.labels("unsupported").inc()
+        return None
+    filterset = ProductFilter(params, queryset=Product.objects.none())
+    if not filterset.is_valid():
+        snapshot_queries.labels("unsupported").inc()
+        return None
+    filters = {
+        name: value
+        for name, value in filterset.form.cleaned_data.items()
+        if value is not None and value != ""
+    }
+    if set(filters) - SNAPSHOT_FILTERS:
+        snapshot_queries.labels("unsupported").inc()
+        return None
+
+    snapshot = get_snapshot()
+    if snapshot is None:
+        snapshot_queries.labels("unavailable").inc()
+        return None
+    snapshot_queries.labels("snapshot").inc()
+    if category is not None:
+        filters["category"] = int(category)
+    return SnapshotQuery(snapshot, filters)
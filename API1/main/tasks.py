@@ -0,0 +1,96 @@
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .blobs import (
+    collect_blobs,
+    delete_files,
+    delete_upload,
+    release_blob,
+    store_blob,
+)
+from .cache import bump_catalog_version
+from .deletion import delete_product_batch, finish_deletion
+from .models import CategoryDeletion
+
+
+@shared_task(bind=True, max_retries=3)
+def generate_image_variants_task(self, model_name, pk, name):
+    """
+    Move a freshly uploaded image to its content-addressed blob, generating
+    variants only for content not seen before, and point the row at it.
+    """
+    model = apps.get_model("main", model_name)
+    if not model.objects.filter(pk=pk, image=name).exists():
+        return
+
+    try:
+        blob = store_blob(name)
+    except FileNotFoundError:
+        # The image was replaced or deleted before the worker got to it.
+        return
+    except Exception as e:
+        raise self.retry(countdown=5, max_retries=3, exc=e)
+
+    values = {"image": blob.name, "image_variants": blob.variants}
+    if any(field.name == "updated" for field in model._meta.fields):
+        values["updated"] = timezone.now()
+    # update() skips post_save, so this does not schedule the task again.
+    with transaction.atomic():
+        updated = model.objects.filter(pk=pk, image=name).update(**values)
+        if updated:
+            transaction.on_commit(bump_catalog_version)
+    if not updated:
+        # The row changed meanwhile; give the reference back, and leave a
+        # blob nothing uses to the collector.
+        if release_blob(blob.name):
+            collect_image_blobs_task.apply_async(
+                countdown=settings.PRODUCT_IMAGE_BLOB_GRACE
+            )
+        return
+
+    if name != blob.name:
+        delete_upload(name)
+
+
+@shared_task
+def collect_image_blobs_task():
+    return collect_blobs()
+
+
+@shared_task(bind=True, max_retries=3)
+def delete_category_task(self, deletion_id):
+    """
+    Delete the products of a hidden category PRODUCT_DELETE_BATCH_SIZE at a
+    time, each batch in its own transaction, then the category itself.
+    Batches are idempotent, so a retry carries on where the last run failed.
+    """
+    deletion = CategoryDeletion.objects.filter(pk=deletion_id, finished=None).first()
+    if deletion is None:
+        return
+
+    released = False
+    try:
+        while True:
+            deleted, batch_released, files = delete_product_batch(
+                deletion, settings.PRODUCT_DELETE_BATCH_SIZE
+            )
+            released = released or batch_released
+            if files:
+                CategoryDeletion.objects.filter(pk=deletion_id).update(
+                    files_deleted=F("files_deleted") + delete_files(files)
+                )
+            if not deleted:
+                break
+        finish_deletion(deletion)
+    except Exception as e:
+        CategoryDeletion.objects.filter(pk=deletion_id).update(error=str(e))
+        raise self.retry(countdown=30, exc=e)
+    finally:
+        if released:
+            collect_image_blobs_task.apply_async(
+                countdown=settings.PRODUCT_IMAGE_BLOB_GRACE
+            )
@@ -1,3 +1,780 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.response import Response
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .admin import VisibleCategoryFilter
+from . import blobs
+from .blobs import collect_blobs, release_blob, store_blob
+from .bulk_update import bulk_update_products
+from .cache import CATALOG_WRITTEN_KEY, bump_catalog_version, get_catalog_version
+from .db_router import (
+    PIN_COOKIE,
+    PIN_HEADER,
+    choose_read_database,
+    lag_checks,
+    measure_replica_lag,
+    pin_to_primary,
+)
+from .graphql_view import OperationLabels
+from .models import Category, ImageBlob, Product, ProductImage
+from .schema import schema
+from .serializers import ProductSerializer
+from .tasks import generate_image_variants_task
+
+NESTED_CATEGORIES = """
+{
+  allCategories {
+    name
+    products {
+      name
+      images { image }
+    }
+  }
+}
+"""
+
+PRODUCTS_WITH_CATEGORY = """
+{
+  allProducts {
+    name
+    category { name }
+  }
+}
+"""
+
+
+def create_catalog(categories, products, images):
+    for i in range(categories):
+        category = Category.objects.create(name=f"category {i}")
+        for j in range(products):
+            product = Product.objects.create(
+                category=category, name=f"product {j}", price=10
+            )
+            ProductImage.objects.bulk_create(
+                ProductImage(product=product, image=f"products/{i}-{j}-{k}.jpg")
+                for k in range(images)
+            )
+
+
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LocalCacheTestCase(TestCase):
+    """
+    Runs against a local cache, emptied before each test, instead of the
+    Redis from the settings: cached responses of earlier tests (or runs)
+    must not be served, and the real catalog version is left alone.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+
+class GraphQLQueryCountTests(LocalCacheTestCase):
+    """Nested GraphQL queries cost one query per level, whatever the row count."""
+
+    def execute(self, query):
+        result = schema.execute(query, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return result.data
+
+    def test_nested_categories_with_one_row(self):
+        create_catalog(categories=1, products=1, images=1)
+        with self.assertNumQueries(3):
+            data = self.execute(NESTED_CATEGORIES)
+        self.assertEqual(len(data["allCategories"][0]["products"][0]["images"]), 1)
+
+    def test_nested_categories_with_many_rows(self):
+        create_catalog(categories=5, products=4, images=3)
+        with self.assertNumQueries(3):
+            data = self.execute(NESTED_CATEGORIES)
+        self.assertEqual(len(data["allCategories"]), 5)
+        for category in data["allCategories"]:
+            self.assertEqual(len(category["products"]), 4)
+            for product in category["products"]:
+                self.assertEqual(len(product["images"]), 3)
+
+    def test_products_with_category_with_one_row(self):
+        create_catalog(categories=1, products=1, images=0)
+        with self.assertNumQueries(1):
+            data = self.execute(PRODUCTS_WITH_CATEGORY)
+        self.assertEqual(data["allProducts"][0]["category"]["name"], "category 0")
+
+    def test_products_with_category_with_many_rows(self):
+        create_catalog(categories=5, products=4, images=0)
+        with self.assertNumQueries(1):
+            data = self.execute(PRODUCTS_WITH_CATEGORY)
+        self.assertEqual(len(data["allProducts"]), 20)
+        self.assertEqual(
+            {product["category"]["name"] for product in data["allProducts"]},
+            {f"category {i}" for i in range(5)},
+        )
+
+
+def admin_auth():
+    token = AccessToken()
+    token["user_id"] = 1
+    token["is_admin"] = True
+    return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+
+def make_image(color, size=(1200, 900), fmt="JPEG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class FileSystemStorageTestCase(LocalCacheTestCase):
+    """Runs against FileSystemStorage in a temporary directory instead of S3."""
+
+    def setUp(self):
+        super().setUp()
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        backend = {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": location, "base_url": "/media/"},
+        }
+        storage_settings = override_settings(
+            STORAGES={
+                "default": backend,
+                "images": backend,
+                "staticfiles": {
+                    "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+                },
+            }
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.storage = storages["images"]
+        self.category = Category.objects.create(name="category")
+
+
+@override_settings(PRODUCT_IMAGE_FORMATS=["jpeg", "webp"])
+class ImageVariantTests(FileSystemStorageTestCase):
+    def create_product(self, content):
+        name = self.storage.save("products/2024/01/01/photo.jpg", ContentFile(content))
+        return Product.objects.create(
+            category=self.category, name=name, price=10, image=name
+        )
+
+    def test_variants_are_generated_and_stored(self):
+        product = self.create_product(make_image("red"))
+        upload = product.image.name
+
+        generate_image_variants_task(product._meta.model_name, product.pk, upload)
+
+        product.refresh_from_db()
+        blob = ImageBlob.objects.get()
+        self.assertEqual(product.image.name, blob.name)
+        self.assertTrue(blob.name.startswith("products/blobs/"))
+        self.assertEqual(product.image_variants, blob.variants)
+        self.assertEqual(blob.ref_count, 1)
+        self.assertEqual(blob.variants["source"], blob.name)
+        self.assertFalse(self.storage.exists(upload))
+
+        for size_name, size in (("thumbnail", 200), ("medium", 800)):
+            self.assertEqual(set(blob.variants[size_name]), {"jpeg", "webp"})
+            for fmt, name in blob.variants[size_name].items():
+                with self.storage.open(name, "rb") as file:
+                    image = Image.open(file)
+                    self.assertEqual(image.format, fmt.upper())
+                    self.assertEqual(max(image.size), size)
+
+        data = self.client.get(f"/api/v1/product/{product.pk}/").json()
+        self.assertEqual(
+            data["image_variants"]["thumbnail"]["webp"],
+            "http://testserver" + self.storage.url(blob.variants["thumbnail"]["webp"]),
+        )
+
+    def test_identical_images_share_one_blob(self):
+        content = make_image("blue")
+        first = self.create_product(content)
+        second = self.create_product(content)
+        self.assertNotEqual(first.image.name, second.image.name)
+
+        for product in (first, second):
+            generate_image_variants_task(
+                product._meta.model_name, product.pk, product.image.name
+            )
+
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        for product in (first, second):
+            product.refresh_from_db()
+            self.assertEqual(product.image.name, blob.name)
+            self.assertEqual(product.image_variants, blob.variants)
+        _, files = self.storage.listdir("products/2024/01/01")
+        self.assertEqual(files, [])
+
+    def test_replaced_image_is_skipped(self):
+        product = self.create_product(make_image("green"))
+        upload = product.image.name
+        Product.objects.filter(pk=product.pk).update(image="")
+
+        generate_image_variants_task(product._meta.model_name, product.pk, upload)
+
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertTrue(self.storage.exists(upload))
+
+    def test_blob_references_are_taken_atomically(self):
+        product = self.create_product(make_image("black"))
+        upload = product.image.name
+
+        blob = store_blob(upload)
+        self.assertEqual(store_blob(upload), blob)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertTrue(self.storage.exists(blob.name))
+
+        # Collected meanwhile: the blob is stored again.
+        ImageBlob.objects.all().delete()
+        again = store_blob(upload)
+        self.assertEqual(again.ref_count, 1)
+        self.assertTrue(self.storage.exists(again.name))
+
+    @override_settings(PRODUCT_IMAGE_BLOB_GRACE=0)
+    def test_collector_deletes_files_before_the_rows(self):
+        product = self.create_product(make_image("yellow"))
+        blob = store_blob(product.image.name)
+        release_blob(blob.name)
+
+        rows_left = []
+        delete = blobs.delete_files
+
+        def delete_files(names):
+            rows_left.append(ImageBlob.objects.filter(pk=blob.pk).exists())
+            return delete(names)
+
+        with mock.patch("main.blobs.delete_files", delete_files):
+            self.assertEqual(collect_blobs(), 1)
+
+        # A store_blob() waiting on the row lock copies the file again.
+        self.assertEqual(rows_left, [True])
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(self.storage.exists(blob.name))
+
+    def test_replaced_upload_is_deleted(self):
+        product = self.create_product(make_image("white"))
+        upload = product.image.name
+        product.image = self.storage.save(
+            "products/2024/01/02/photo.jpg", ContentFile(make_image("gray"))
+        )
+
+        with mock.patch.object(generate_image_variants_task, "delay"):
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+
+        self.assertFalse(self.storage.exists(upload))
+        self.assertTrue(self.storage.exists(product.image.name))
+
+
+class DirectUploadTests(FileSystemStorageTestCase):
+    """The presign -> upload -> confirm flow, with the service as the bucket."""
+
+    def setUp(self):
+        super().setUp()
+        self.auth = admin_auth()
+        self.product = Product.objects.create(
+            category=self.category, name="product", price=10
+        )
+
+    def presign(self, filename="photo.jpg", content_type="image/jpeg"):
+        response = self.client.post(
+            "/api/v1/product/upload/",
+            {"filename": filename, "content_type": content_type},
+            content_type="application/json",
+            **self.auth,
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def upload(self, upload, content, filename="photo.jpg"):
+        return self.client.post(
+            upload["url"],
+            {**upload["fields"], "file": SimpleUploadedFile(filename, content)},
+        )
+
+    def confirm(self, upload, gallery=False):
+        return self.client.post(
+            f"/api/v1/product/{self.product.pk}/image/",
+            {"upload_id": upload["upload_id"], "gallery": gallery},
+            content_type="application/json",
+            **self.auth,
+        )
+
+    def test_upload_and_confirm(self):
+        upload = self.presign()
+        self.assertEqual(upload["url"], "http://testserver/api/v1/product/upload/file/")
+        self.assertEqual(self.upload(upload, make_image("red")).status_code, 204)
+
+        response = self.confirm(upload)
+
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        name = self.product.image.name
+        self.assertRegex(name, r"^products/\d{4}/\d{2}/\d{2}/[0-9a-f]{32}\.jpg$")
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(response.json()["image"], f"http://testserver/media/{name}")
+
+    def test_confirm_to_gallery(self):
+        upload = self.presign("photo.png", "image/png")
+        self.upload(upload, make_image("red", fmt="PNG"), "photo.png")
+
+        self.assertEqual(self.confirm(upload, gallery=True).status_code, 200)
+
+        image = ProductImage.objects.get(product=self.product)
+        self.assertTrue(image.image.name.endswith(".png"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image.name, "")
+
+    def test_confirm_before_upload(self):
+        response = self.confirm(self.presign())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {"upload_id": "The file has not been uploaded."}
+        )
+
+    def test_file_that_is_not_an_image_is_deleted(self):
+        upload = self.presign()
+        self.upload(upload, b"<html></html>")
+
+        response = self.confirm(upload)
+
+        self.assertEqual(response.status_code, 400)
+        _, files = self.storage.listdir(timezone.now().strftime("products/%Y/%m/%d"))
+        self.assertEqual(files, [])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image.name, "")
+
+    def test_upload_is_checked_against_the_policy(self):
+        upload = self.presign()
+        tampered = {**upload, "fields": {**upload["fields"], "policy": "x"}}
+        self.assertEqual(self.upload(tampered, make_image("red")).status_code, 403)
+        other_type = {
+            **upload,
+            "fields": {**upload["fields"], "Content-Type": "image/png"},
+        }
+        self.assertEqual(self.upload(other_type, make_image("red")).status_code, 403)
+
+        self.assertEqual(self.upload(upload, make_image("red")).status_code, 204)
+        self.assertEqual(self.upload(upload, make_image("blue")).status_code, 403)
+
+    @override_settings(PRODUCT_UPLOAD_MAX_SIZE=100)
+    def test_upload_size_is_limited(self):
+        upload = self.presign()
+        self.assertEqual(self.upload(upload, make_image("red")).status_code, 403)
+
+    def test_presign_requires_admin(self):
+        response = self.client.post(
+            "/api/v1/product/upload/",
+            {"filename": "photo.jpg", "content_type": "image/jpeg"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class BulkUpdateTests(LocalCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name="category")
+        self.available = Product.objects.create(
+            category=category, name="available", price=100, available=True
+        )
+        self.unavailable = Product.objects.create(
+            category=category, name="unavailable", price=100, available=False
+        )
+
+    def bulk_update(self, changes, **selection):
+        response = self.client.post(
+            "/api/v1/product/bulk-update/",
+            {"changes": changes, **selection},
+            content_type="application/json",
+            **admin_auth(),
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["affected"]
+
+    def test_unavailable_products_keep_their_price(self):
+        ids = [self.available.pk, self.unavailable.pk]
+        self.assertEqual(self.bulk_update({"price_percent": 10}, ids=ids), 1)
+        self.assertEqual(self.bulk_update({"price": 50, "discount": 5}, ids=ids), 2)
+        self.available.refresh_from_db()
+        self.unavailable.refresh_from_db()
+        self.assertEqual(self.available.price, 50)
+        self.assertEqual(self.unavailable.price, 100)
+        self.assertEqual(self.unavailable.discount, 5)
+
+        self.bulk_update({"price": 70, "available": True}, ids=ids)
+        self.unavailable.refresh_from_db()
+        self.assertEqual(self.unavailable.price, 70)
+
+    def test_rows_that_stop_matching_are_not_updated(self):
+        atomic = transaction.atomic
+
+        def atomic_after_change():
+            # Changed between reading the ids and the UPDATE.
+            Product.objects.filter(pk=self.available.pk).update(discount=50)
+            return atomic()
+
+        queryset = Product.objects.filter(discount__lte=10)
+        with mock.patch("main.bulk_update.transaction.atomic", atomic_after_change):
+            affected = bulk_update_products(queryset, {"available": True})
+
+        self.assertEqual(affected, 1)
+        self.unavailable.refresh_from_db()
+        self.assertTrue(self.unavailable.available)
+
+
+@override_settings(
+    CACHES=LOCAL_CACHES, DB_REPLICAS=["replica"], DB_REPLICA_PIN_SECONDS=15
+)
+class ReadRoutingTests(SimpleTestCase):
+    """Read-your-writes applies to the writing client only."""
+
+    def setUp(self):
+        cache.clear()
+        # A replica measured just now, with no lag.
+        lag_checks["replica"] = (time.monotonic(), 0.0)
+        self.addCleanup(lag_checks.pop, "replica", None)
+        self.factory = RequestFactory()
+
+    def test_other_clients_read_from_replica_after_a_write(self):
+        bump_catalog_version()
+        request = self.factory.get("/api/v1/product/")
+        self.assertEqual(choose_read_database(request), ("replica", "replica"))
+
+    def test_writer_is_pinned_by_cookie(self):
+        request = self.factory.get("/api/v1/product/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        self.assertEqual(choose_read_database(request), (None, "pinned"))
+
+    def test_writer_is_pinned_by_header(self):
+        response = Response()
+        pin_to_primary(response)
+        request = self.factory.get(
+            "/api/v1/product/", headers={PIN_HEADER: response[PIN_HEADER]}
+        )
+        self.assertEqual(choose_read_database(request), (None, "pinned"))
+
+    def test_pin_header_expires(self):
+        for until in (time.time() - 1, time.time() + 3600, "soon"):
+            request = self.factory.get(
+                "/api/v1/product/", headers={PIN_HEADER: str(until)}
+            )
+            self.assertEqual(choose_read_database(request), ("replica", "replica"))
+
+    def measure_lag(self, streaming, replayed_all, replayed_ago):
+        now = time.time()
+        cursor = mock.Mock()
+        cursor.fetchone.return_value = (
+            True,
+            streaming,
+            replayed_all,
+            now - replayed_ago,
+            replayed_ago,
+        )
+        return measure_replica_lag(cursor)
+
+    def test_disconnected_replica_is_not_caught_up(self):
+        bump_catalog_version()
+        self.assertEqual(self.measure_lag(True, True, 3600), 0)
+        # Replayed everything it received, but received nothing for an hour.
+        self.assertEqual(self.measure_lag(False, True, 3600), 3600)
+        # It replayed a transaction after the last catalog write.
+        cache.set(CATALOG_WRITTEN_KEY, time.time() - 7200, timeout=None)
+        self.assertEqual(self.measure_lag(False, True, 3600), 0)
+
+
+@override_settings(
+    DB_REPLICAS=["default"],
+    GRAPHQL_DEFAULT_MAX_AGE=60,
+)
+class GraphQLReplicaCacheTests(LocalCacheTestCase):
+    """Results read from a replica right after a write are not cached."""
+
+    def setUp(self):
+        super().setUp()
+        # The primary stands in for a replica measured just now.
+        lag_checks["default"] = (time.monotonic(), 0.0)
+        self.addCleanup(lag_checks.pop, "default", None)
+        create_catalog(categories=1, products=1, images=0)
+
+    def query(self):
+        with mock.patch("main.graphql_view.set_cached") as set_cached:
+            response = self.client.post(
+                "/api/v1/graphql/",
+                {"query": PRODUCTS_WITH_CATEGORY},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        return set_cached
+
+    def test_result_is_not_cached_after_a_write(self):
+        bump_catalog_version()
+        self.query().assert_not_called()
+
+    def test_result_is_cached_once_the_replica_caught_up(self):
+        bump_catalog_version()
+        cache.set(CATALOG_WRITTEN_KEY, time.time() - 3600, timeout=None)
+        self.query().assert_called_once()
+
+
+class ProductSerializerTests(LocalCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.auth = admin_auth()
+        self.category = Category.objects.create(name="category")
+        self.product = Product.objects.create(
+            category=self.category, name="product", price=10
+        )
+
+    def test_key_order(self):
+        data = self.client.get(f"/api/v1/product/{self.product.pk}/").json()
+        self.assertEqual(
+            list(data),
+            [
+                "id",
+                "sell_price",
+                "image_variants",
+                "name",
+                "image",
+                "description",
+                "price",
+                "available",
+                "created",
+                "updated",
+                "discount",
+                "category",
+            ],
+        )
+
+    def test_duplicate_name_keeps_the_transaction_usable(self):
+        response = self.client.post(
+            "/api/v1/product/",
+            {
+                "category": self.category.pk,
+                "name": "product",
+                "price": "5.00",
+                "available": True,
+            },
+            content_type="application/json",
+            **self.auth,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(),
+            {"name": ["A product with this name already exists in this category."]},
+        )
+        # Without a savepoint the aborted transaction would fail this query.
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_sell_price_after_create(self):
+        response = self.client.post(
+            "/api/v1/product/",
+            {
+                "category": self.category.pk,
+                "name": "other",
+                "price": "20.00",
+                "discount": "25.00",
+                "available": True,
+            },
+            content_type="application/json",
+            **self.auth,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["sell_price"], "15.00")
+
+    def update(self, data):
+        return ProductSerializer(self.product, data=data, partial=True)
+
+    def test_sell_price_is_read_again_when_the_price_changes(self):
+        serializer = self.update(
+            {
+                "name": "product",
+                "price": "40.00",
+                "discount": "10.00",
+                "available": True,
+            }
+        )
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+        self.assertEqual(serializer.data["sell_price"], "36.00")
+        self.assertTrue(
+            any(
+                query["sql"].startswith("SELECT") and '"sell_price"' in query["sql"]
+                for query in queries
+            )
+        )
+
+    def test_sell_price_is_not_read_again_otherwise(self):
+        serializer = self.update({"name": "product", "description": "new"})
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+        self.assertEqual(serializer.data["sell_price"], "10.00")
+        self.assertFalse(
+            any('"sell_price"' in query["sql"] for query in queries),
+            [query["sql"] for query in queries],
+        )
+
+    def test_sell_price_rounds_half_to_even(self):
+        for price, sell_price in (("10.05", "5.02"), ("10.15", "5.08")):
+            Product.objects.filter(pk=self.product.pk).update(
+                price=Decimal(price), discount=50
+            )
+            data = self.client.get(f"/api/v1/product/{self.product.pk}/").json()
+            self.assertEqual(data["sell_price"], sell_price, price)
+            # update() does not bump the catalog version.
+            cache.clear()
+
+    def test_update_is_one_statement(self):
+        serializer = self.update({"name": "product", "description": "new"})
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+        self.assertEqual(
+            [
+                query["sql"].split()[0]
+                for query in queries
+                if "SAVEPOINT" not in query["sql"]
+            ],
+            ["UPDATE"],
+        )
+
+
+class IdValidationTests(LocalCacheTestCase):
+    """Digits beyond 0-9 are rejected like any other malformed id."""
+
+    def test_batch_ids(self):
+        response = self.client.get("/api/v1/product/batch/", {"ids": "1,²"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_product_detail(self):
+        response = self.client.get("/api/v1/product/²/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_changes_since_and_limit(self):
+        for params in ({"since": "²"}, {"limit": "²"}):
+            response = self.client.get("/api/v1/product/changes/", params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_category_deletion(self):
+        response = self.client.get("/api/v1/category/²/deletion/", **admin_auth())
+        self.assertEqual(response.status_code, 404)
+
+
+class OperationLabelTests(SimpleTestCase):
+    def test_names_beyond_the_limit_are_other(self):
+        labels = OperationLabels(allowed=["Menu"], limit=2)
+        self.assertEqual(
+            [labels.get(name) for name in ["A", "B", "C", "A", "Menu", "D"]],
+            ["A", "B", "other", "A", "Menu", "other"],
+        )
+
+
+class CatalogVersionTests(LocalCacheTestCase):
+    """Writes that change catalog responses move the catalog version."""
+
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name="category")
+        self.product = Product.objects.create(
+            category=category, name="product", price=10
+        )
+
+    def assertBumps(self, write):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertNotEqual(get_catalog_version(), version)
+
+    def test_gallery_image_changes(self):
+        image = ProductImage(product=self.product)
+        self.assertBumps(image.save)
+        self.assertBumps(image.delete)
+
+
+class AdminHiddenCategoryTests(LocalCacheTestCase):
+    """Categories being deleted and their products stay out of the admin."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(
+            get_user_model().objects.create_superuser("admin", "admin@example.com")
+        )
+        self.visible = Category.objects.create(name="visible")
+        self.hidden = Category.objects.create(name="hidden")
+        for category in (self.visible, self.hidden):
+            for i in range(2):
+                Product.objects.create(
+                    category=category, name=f"{category.name} {i}", price=10
+                )
+        Category.objects.filter(pk=self.hidden.pk).update(hidden=True)
+
+    def test_product_changelist(self):
+        response = self.client.get("/admin/main/product/")
+        self.assertEqual(
+            {product.name for product in response.context["cl"].result_list},
+            {"visible 0", "visible 1"},
+        )
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+    def test_category_filter(self):
+        other = Category.objects.create(name="other")
+        response = self.client.get("/admin/main/product/")
+        (spec,) = [
+            spec
+            for spec in response.context["cl"].filter_specs
+            if isinstance(spec, VisibleCategoryFilter)
+        ]
+        self.assertEqual(
+            sorted(spec.lookup_choices),
+            sorted([(self.visible.pk, "visible"), (other.pk, "other")]),
+        )
+
+    @override_settings(ADMIN_COUNT_LIMIT=1)
+    def test_estimated_count_leaves_out_hidden_products(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE main_product")
+        response = self.client.get("/admin/main/product/")
+        self.assertTrue(response.context["cl"].paginator.estimated)
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+    def test_category_autocomplete(self):
+        response = self.client.get(
+            "/admin/autocomplete/",
+            {"app_label": "main", "model_name": "product", "field_name": "category"},
+        )
+        self.assertEqual(
+            [result["text"] for result in response.json()["results"]], ["visible"]
+        )
+
+    def test_product_form(self):
+        response = self.client.get("/admin/main/product/add/")
+        queryset = response.context["adminform"].form.fields["category"].queryset
+        self.assertEqual(list(queryset), [self.visible])
+
+    def test_category_changelist_marks_hidden(self):
+        response = self.client.get("/admin/main/category/", {"q": "hidden"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.hidden])
+        self.assertContains(response, 'alt="True"')
@@ -0,0 +1,180 @@
+import mimetypes
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+
+UPLOAD_SALT = "main.uploads"
+UPLOAD_POLICY_SALT = "main.uploads.policy"
+
+# Content type -> allowed extensions and the leading bytes of such a file.
+UPLOAD_TYPES = {
+    "image/jpeg": (("jpg", "jpeg"), b"\xff\xd8\xff"),
+    "image/png": (("png",), b"\x89PNG\r\n\x1a\n"),
+}
+
+
+class DirectUploadError(Exception):
+    pass
+
+
+def get_client(storage=default_storage):
+    """The boto3 client of an S3-compatible storage, or None for other storages."""
+    client = getattr(getattr(storage, "connection", None), "meta", None)
+    return client.client if client is not None else None
+
+
+def create_upload(filename, content_type, storage=default_storage, request=None):
+    """
+    Presign a POST that lets the client upload one image straight to the
+    bucket, under the same ``products/%Y/%m/%d`` prefix as ImageField uploads.
+    Storages without S3 (FileSystemStorage in development and tests) get a
+    signed form for the ``upload/file`` endpoint of this service instead.
+    """
+    client = get_client(storage)
+    ext = os.path.splitext(filename)[1].lstrip(".").lower()
+    name = timezone.now().strftime("products/%Y/%m/%d/") + f"{uuid.uuid4().hex}.{ext}"
+    upload = {"name": name, "content_type": content_type}
+
+    if client is None:
+        url = reverse("product-upload-file")
+        post = {
+            "url": request.build_absolute_uri(url) if request is not None else url,
+            "fields": {
+                "Content-Type": content_type,
+                "policy": signing.dumps(upload, salt=UPLOAD_POLICY_SALT),
+            },
+        }
+    else:
+        fields = {"Content-Type": content_type}
+        conditions = [
+            {"Content-Type": content_type},
+            ["content-length-range", 1, settings.PRODUCT_UPLOAD_MAX_SIZE],
+        ]
+        if storage.default_acl:
+            fields["acl"] = storage.default_acl
+            conditions.append({"acl": storage.default_acl})
+
+        post = client.generate_presigned_post(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(name),
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=settings.PRODUCT_UPLOAD_EXPIRES,
+        )
+    return {
+        "upload_id": signing.dumps(upload, salt=UPLOAD_SALT),
+        "url": post["url"],
+        "fields": post["fields"],
+        "expires_in": settings.PRODUCT_UPLOAD_EXPIRES,
+    }
+
+
+def save_upload(policy, content_type, file, storage=default_storage):
+    """
+    Store a file posted to the ``upload/file`` endpoint under the name its
+    signed policy was issued for, with the checks S3 applies to a
+    presigned POST. Returns the storage name.
+    """
+    try:
+        upload = signing.loads(
+            policy, salt=UPLOAD_POLICY_SALT, max_age=settings.PRODUCT_UPLOAD_EXPIRES
+        )
+    except signing.SignatureExpired:
+        raise DirectUploadError("The upload policy has expired.")
+    except signing.BadSignature:
+        raise DirectUploadError("Invalid upload policy.")
+
+    if content_type != upload["content_type"]:
+        raise DirectUploadError("The content type does not match the policy.")
+    if not 1 <= file.size <= settings.PRODUCT_UPLOAD_MAX_SIZE:
+        raise DirectUploadError("The file size is not allowed.")
+    if storage.exists(upload["name"]):
+        raise DirectUploadError("The file has already been uploaded.")
+    return storage.save(upload["name"], file)
+
+
+def read_upload(name, length, storage):
+    """Size, content type and first ``length`` bytes of an uploaded file."""
+    client = get_client(storage)
+    if client is None:
+        if not storage.exists(name):
+            return None
+        with storage.open(name, "rb") as file:
+            start = file.read(length)
+        content_type = mimetypes.guess_type(name)[0]
+        return storage.size(name), content_type, start
+
+    key = storage._normalize_name(name)
+    try:
+        head = client.head_object(Bucket=storage.bucket_name, Key=key)
+    except client.exceptions.ClientError:
+        return None
+    start = client.get_object(
+        Bucket=storage.bucket_name, Key=key, Range=f"bytes=0-{length - 1}"
+    )["Body"].read()
+    return head["ContentLength"], head.get("ContentType"), start
+
+
+def verify_upload(upload_id, storage=default_storage):
+    """
+    Check an uploaded object against the upload it was presigned for and
+    return its storage name. Objects that fail the checks are deleted.
+    """
+    try:
+        upload = signing.loads(
+            upload_id,
+            salt=UPLOAD_SALT,
+            max_age=settings.PRODUCT_UPLOAD_EXPIRES
+            + settings.PRODUCT_UPLOAD_CONFIRM_GRACE,
+        )
+    except signing.SignatureExpired:
+        raise serializers.ValidationError({"upload_id": "The upload has expired."})
+    except signing.BadSignature:
+        raise serializers.ValidationError({"upload_id": "Invalid upload id."})
+
+    name = upload["name"]
+    _, magic = UPLOAD_TYPES[upload["content_type"]]
+    uploaded = read_upload(name, len(magic), storage)
+    if uploaded is None:
+        raise serializers.ValidationError(
+            {"upload_id": "The file has not been uploaded."}
+        )
+
+    size, content_type, start = uploaded
+    error = None
+    if size > settings.PRODUCT_UPLOAD_MAX_SIZE:
+        error = "The file is too large."
+    elif content_type != upload["content_type"]:
+        error = "The file content type does not match the upload."
+    elif start != magic:
+        error = "Only JPG and PNG images are allowed."
+
+    if error:
+        storage.delete(name)
+        raise serializers.ValidationError({"upload_id": error})
+    return name
+
+
+class UploadRequestSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.ChoiceField(choices=list(UPLOAD_TYPES))
+
+    def validate(self, data):
+        extensions, _ = UPLOAD_TYPES[data["content_type"]]
+        ext = os.path.splitext(data["filename"])[1].lstrip(".").lower()
+        if ext not in extensions:
+            raise serializers.ValidationError(
+                {"filename": "Only JPG and PNG images are allowed."}
+            )
+        return data
+
+
+class UploadConfirmSerializer(serializers.Serializer):
+    upload_id = serializers.CharField()
+    gallery = serializers.BooleanField(default=False)
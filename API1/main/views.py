@@ -1,20 +1,62 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from rest_framework import viewsets
-from .models import Product, Category
+from .models import Product, Category, CategoryDeletion, ProductImage
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from .serializers import ProductSerializer, CategorySerializer
-from rest_framework.filters import SearchFilter
+from .serializers import (
+    BATCH_FIELDS,
+    ProductBatchSerializer,
+    ProductSerializer,
+    ProductValuesSerializer,
+    CategorySerializer,
+    CategoryDeletionSerializer,
+)
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 import requests
 from django.conf import settings
 from .filters import ProductFilter
+from .pagination import KeysetPagination
+from .search import ProductSearchFilter, search_products
+from .snapshot import get_snapshot_query
 from .logs_service import log_to_kafka
+from .deletion import start_category_deletion
+from .cache import (
+    cached_response,
+    catalog_etag,
+    conditional_response,
+    make_etag,
+)
+from .db_router import ReplicaReadMixin
+from .facets import get_facets
+from .changes import get_changes
+from .export import EXPORT_CONTENT_TYPES, export_products
+from .bulk_update import ProductBulkUpdateSerializer, bulk_update_products
+from .uploads import (
+    DirectUploadError,
+    UploadConfirmSerializer,
+    UploadRequestSerializer,
+    create_upload,
+    save_upload,
+    verify_upload,
+)
+from .importer import IMPORT_CONTENT_TYPES, ProductImporter, iter_rows
+import re
+from functools import partial
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
 USER_SERVICE_URL = settings.USER_SERVICE_URL
 
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+# Ids and sequence numbers; str.isdigit() also accepts "²", which int() rejects.
+DIGITS = re.compile(r"[0-9]+")
+
 
 class AdminRequiredMixin:
 
@@ -34,12 +76,210 @@ class AdminRequiredMixin:
         return self.get_user_from_token(request)
 
 
-class ProductAPIview(AdminRequiredMixin, viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+class ProductAPIview(ReplicaReadMixin, AdminRequiredMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.visible()
     serializer_class = ProductSerializer
-    filter_backends = (DjangoFilterBackend, SearchFilter)
+    filter_backends = (DjangoFilterBackend, ProductSearchFilter)
     filterset_class = ProductFilter
-    search_fields = ["name"]
+    search_fields = ["name", "description"]
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            partial(
+                cached_response,
+                "product-list",
+                request,
+                partial(self.build_list_response, request),
+            ),
+            catalog_etag(request, "product-list"),
+        )
+
+    def build_list_response(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginator.paginate_queryset(
+            ProductValuesSerializer.values(queryset),
+            request,
+            view=self,
+            snapshot=get_snapshot_query(request.query_params),
+        )
+        serializer = ProductValuesSerializer(context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.serialize(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs["pk"]
+        updated = None
+        if DIGITS.fullmatch(str(pk)):
+            updated = (
+                Product.objects.visible()
+                .filter(pk=pk)
+                .values_list("updated", flat=True)
+                .first()
+            )
+        etag = None
+        if updated is not None:
+            etag = make_etag(request, "product-detail", pk, updated.isoformat())
+
+        return conditional_response(
+            request,
+            partial(
+                cached_response,
+                "product-detail",
+                request,
+                partial(super().retrieve, request, *args, **kwargs),
+                pk,
+            ),
+            etag,
+            updated,
+        )
+
+    @action(methods=["get"], detail=False)
+    def batch(self, request):
+        ids = []
+        for value in request.GET.getlist("ids"):
+            for part in value.split(","):
+                part = part.strip()
+                if not part:
+                    continue
+                if not DIGITS.fullmatch(part):
+                    return Response(
+                        {"ids": f"'{part}' is not a valid product id."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                if int(part) not in ids:
+                    ids.append(int(part))
+
+        if not ids:
+            return Response(
+                {"ids": "At least one product id is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(ids) > settings.PRODUCT_BATCH_MAX_IDS:
+            return Response(
+                {
+                    "ids": f"At most {settings.PRODUCT_BATCH_MAX_IDS} ids can be requested at once."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        response = conditional_response(
+            request,
+            partial(
+                cached_response,
+                "product-batch",
+                request,
+                partial(self.build_batch_response, request, ids),
+                ",".join(map(str, ids)),
+            ),
+            catalog_etag(request, "product-batch"),
+        )
+        patch_cache_control(
+            response, public=True, max_age=settings.PRODUCT_BATCH_MAX_AGE
+        )
+        return response
+
+    def build_batch_response(self, request, ids):
+        products = Product.objects.visible().only(*BATCH_FIELDS).in_bulk(ids)
+        serializer = ProductBatchSerializer(
+            [products[pk] for pk in ids if pk in products],
+            many=True,
+            context={"request": request},
+        )
+        return Response(
+            {
+                "results": serializer.data,
+                "missing": [pk for pk in ids if pk not in products],
+            }
+        )
+
+    @action(methods=["get"], detail=False)
+    def facets(self, request):
+        return conditional_response(
+            request,
+            partial(
+                cached_response,
+                "product-facets",
+                request,
+                partial(self.build_facets_response, request),
+            ),
+            catalog_etag(request, "product-facets"),
+        )
+
+    def build_facets_response(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(get_facets(queryset))
+
+    @action(methods=["get"], detail=False)
+    def changes(self, request):
+        since = request.GET.get("since", "0")
+        if not DIGITS.fullmatch(since):
+            return Response(
+                {"since": "Must be a sequence number from a previous response."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = request.GET.get("limit", str(settings.PRODUCT_CHANGES_PAGE_SIZE))
+        if (
+            not DIGITS.fullmatch(limit)
+            or not 1 <= int(limit) <= settings.PRODUCT_CHANGES_MAX_PAGE_SIZE
+        ):
+            return Response(
+                {
+                    "limit": f"Must be between 1 and {settings.PRODUCT_CHANGES_MAX_PAGE_SIZE}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        data = get_changes(int(since), int(limit), self.get_serializer_context())
+        data["next"] = None
+        if data.pop("has_more"):
+            data["next"] = replace_query_param(
+                request.build_absolute_uri(), "since", data["next_since"]
+            )
+        return Response(data)
+
+    @action(methods=["get"], detail=False)
+    def export(self, request):
+        fmt = request.GET.get("type", "ndjson")
+        if fmt not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {"type": f"Use one of: {', '.join(EXPORT_CONTENT_TYPES)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # The rows are read after the view returns: bind the database now.
+        queryset = Product.objects.visible()
+        queryset = queryset.using(queryset.db)
+        since = request.GET.get("updated__gte")
+        if since:
+            try:
+                updated = parse_datetime(since)
+            except ValueError:
+                updated = None
+            if updated is None:
+                return Response(
+                    {"updated__gte": "Enter a valid ISO 8601 datetime."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if timezone.is_naive(updated):
+                updated = timezone.make_aware(updated)
+            queryset = queryset.filter(updated__gte=updated)
+
+        started = timezone.now()
+        compress = bool(ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", "")))
+        response = StreamingHttpResponse(
+            export_products(
+                queryset, fmt, self.get_serializer_context(), compress=compress
+            ),
+            content_type=EXPORT_CONTENT_TYPES[fmt],
+        )
+        if compress:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        response["Content-Disposition"] = f'attachment; filename="products.{fmt}"'
+        # Pass this back as updated__gte to fetch only what changed since.
+        response["X-Export-Started"] = started.isoformat()
+        return response
 
     def create(self, request, *args, **kwargs):
         if not self.is_admin(request):
@@ -87,11 +327,161 @@ class ProductAPIview(AdminRequiredMixin, viewsets.ModelViewSet):
         )
         return super().destroy(request, *args, **kwargs)
 
+    @action(methods=["post"], detail=False)
+    def upload(self, request):
+        if not self.is_admin(request):
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        serializer = UploadRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = create_upload(**serializer.validated_data, request=request)
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+    @action(
+        methods=["post"],
+        detail=False,
+        url_path="upload/file",
+        parser_classes=[MultiPartParser],
+    )
+    def upload_file(self, request):
+        # Stands in for the bucket when storage is not S3; the signed policy
+        # authorizes the upload just like a presigned POST does.
+        file = request.FILES.get("file")
+        if file is None:
+            return Response(
+                {"detail": "No file was uploaded."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            save_upload(
+                request.data.get("policy", ""),
+                request.data.get("Content-Type"),
+                file,
+            )
+        except DirectUploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_403_FORBIDDEN)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(methods=["post"], detail=True)
+    def image(self, request, pk=None):
+        if not self.is_admin(request):
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        product = self.get_object()
+        serializer = UploadConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        name = verify_upload(serializer.validated_data["upload_id"])
 
-class CategoryViewSet(AdminRequiredMixin, viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+        if serializer.validated_data["gallery"]:
+            ProductImage.objects.create(product=product, image=name)
+        else:
+            product.image = name
+            product.save(update_fields=["image", "updated"])
+
+        log_to_kafka(
+            message="Admin uploaded a product image.",
+            level="info",
+            extra_data={
+                "action": "upload_image",
+                "product_id": product.id,
+                "image": name,
+                "gallery": serializer.validated_data["gallery"],
+            },
+        )
+        product.refresh_from_db()
+        return Response(
+            ProductSerializer(product, context=self.get_serializer_context()).data,
+            status=status.HTTP_200_OK,
+        )
+
+    @action(methods=["post"], detail=False, url_path="bulk-import")
+    def bulk_import(self, request):
+        if not self.is_admin(request):
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        content_type = request.content_type.split(";")[0].strip()
+        fmt = IMPORT_CONTENT_TYPES.get(content_type)
+        if fmt is None:
+            return Response(
+                {
+                    "detail": "Unsupported content type. Use one of: "
+                    + ", ".join(IMPORT_CONTENT_TYPES)
+                },
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+
+        # Read the body line by line instead of through request.data so the
+        # upload is never held in memory as a whole.
+        report = ProductImporter().run(iter_rows(request._request, fmt))
+
+        log_to_kafka(
+            message="Admin imported products.",
+            level="info",
+            extra_data={
+                "action": "bulk_import",
+                "total": report["total"],
+                "created": report["created"],
+                "failed": report["failed"],
+            },
+        )
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(methods=["post"], detail=False, url_path="bulk-update")
+    def bulk_update(self, request):
+        if not self.is_admin(request):
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        serializer = ProductBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = serializer.validated_data["changes"]
+        affected = bulk_update_products(serializer.get_queryset(), changes)
+
+        log_to_kafka(
+            message="Admin bulk updated products.",
+            level="info",
+            extra_data={
+                "action": "bulk_update",
+                "selection": {
+                    key: request.data.get(key)
+                    for key in ("ids", "category", "filters")
+                    if key in request.data
+                },
+                "changes": request.data.get("changes"),
+                "affected": affected,
+            },
+        )
+        return Response({"affected": affected}, status=status.HTTP_200_OK)
+
+
+class CategoryViewSet(ReplicaReadMixin, AdminRequiredMixin, viewsets.ModelViewSet):
+    queryset = Category.objects.visible()
     serializer_class = CategorySerializer
 
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            partial(super().list, request, *args, **kwargs),
+            catalog_etag(request, "category-list"),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            partial(super().retrieve, request, *args, **kwargs),
+            catalog_etag(request, "category-detail", kwargs["pk"]),
+        )
+
     def create(self, request, *args, **kwargs):
         if not self.is_admin(request):
             return Response(
@@ -131,16 +521,63 @@ class CategoryViewSet(AdminRequiredMixin, viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
+        deletion = start_category_deletion(self.get_object())
+        if deletion is None:
+            return Response(
+                {"detail": "No Category matches the given query."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
         log_to_kafka(
             message="Admin deleted a category.",
             level="info",
-            extra_data={"action": "delete", "category_id": kwargs["pk"]},
+            extra_data={
+                "action": "delete",
+                "category_id": kwargs["pk"],
+                "products": deletion.total,
+            },
+        )
+        return Response(
+            CategoryDeletionSerializer(deletion).data, status=status.HTTP_202_ACCEPTED
         )
-        return super().destroy(request, *args, **kwargs)
+
+    @action(methods=["get"], detail=True)
+    def deletion(self, request, pk=None):
+        if not self.is_admin(request):
+            return Response(
+                {"detail": "You do not have permission to perform this action."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        # Looked up by id only: the category may already be gone.
+        deletion = None
+        if DIGITS.fullmatch(str(pk)):
+            deletion = (
+                CategoryDeletion.objects.filter(category_id=pk).order_by("-id").first()
+            )
+        if deletion is None:
+            return Response(
+                {"detail": "This category is not being deleted."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(CategoryDeletionSerializer(deletion).data)
 
     @action(methods=["get"], detail=True)
     def products(self, request, pk=None):
-        category = Category.objects.get(pk=pk)
+        return conditional_response(
+            request,
+            partial(
+                cached_response,
+                "category-products",
+                request,
+                partial(self.build_products_response, request, pk),
+                pk,
+            ),
+            catalog_etag(request, "category-products", pk),
+        )
+
+    def build_products_response(self, request, pk):
+        category = get_object_or_404(Category.objects.visible(), pk=pk)
         products = Product.objects.filter(category=category)
 
         filterset = ProductFilter(request.GET, queryset=products)
@@ -149,7 +586,14 @@ class CategoryViewSet(AdminRequiredMixin, viewsets.ModelViewSet):
 
         search_query = request.GET.get("search", None)
         if search_query:
-            products = products.filter(name__icontains=search_query)
+            products = search_products(products, search_query)
 
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(
+            ProductValuesSerializer.values(products),
+            request,
+            view=self,
+            snapshot=get_snapshot_query(request.GET, category=category.id),
+        )
+        serializer = ProductValuesSerializer()
+        return paginator.get_paginated_response(serializer.serialize(page))